@@ -1,11 +1,20 @@
 import os
+import sys
 import time
+import random
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 from sodapy import Socrata
+from requests.adapters import HTTPAdapter
 import json
 # 导入 text 用于 SQL 查询
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from dotenv import load_dotenv
+from refresh_summaries import refresh_all, CHICAGO_TABLES
+# 多行 INSERT 的行数由 db.insert_chunksize 按语句大小上限计算
+from db import engine_from_env, insert_chunksize
 
 # 加载环境变量
 load_dotenv()
@@ -15,108 +24,208 @@ SOCRATA_DOMAIN = os.getenv("SOCRATA_DOMAIN")
 DATASET_ID = os.getenv("SOCRATA_DATASET_ID")
 APP_TOKEN = os.getenv("SOCRATA_APP_TOKEN")
 
-TIDB_USER = os.getenv("TIDB_USER")
-TIDB_PASSWORD = os.getenv("TIDB_PASSWORD")
-TIDB_HOST = os.getenv("TIDB_HOST")
-TIDB_PORT = os.getenv("TIDB_PORT")
-TIDB_DB_NAME = os.getenv("TIDB_DB_NAME")
-CA_PATH = os.getenv("TID_CA_PATH")
+# 每页拉取的记录数 (Socrata 单次最多 50000)
+PAGE_SIZE = 50000
+# 每个年份在写库时最多预取的页数
+PREFETCH_PAGES = 2
 
-# 构建连接字符串 (使用 pymysql 驱动)
-# 注意：TiDB Cloud Serverless 建议在连接字符串中包含 SSL 配置
-conn_str = f"mysql+pymysql://{TIDB_USER}:{TIDB_PASSWORD}@{TIDB_HOST}:{TIDB_PORT}/{TIDB_DB_NAME}?ssl_ca={CA_PATH}"
+# 并发抓取的年份数；每个年份线程持有一个连接，连接池大小与线程数一致
+MAX_WORKERS = 4
+
+# 任一年份失败时由主线程置位，其余年份的写入线程在两页之间检查后退出 (并通知各自的预取线程)
+stop_event = threading.Event()
 
 client = Socrata(SOCRATA_DOMAIN, APP_TOKEN, timeout=60)
-engine = create_engine(conn_str)
+# sodapy 内部用 requests.Session 发请求：挂载连接池让各线程复用 TLS 连接
+# 适配器本身不重试：限流/5xx/网络错误统一由 fetch_pages 的重试循环 (指数退避，最多 10 次) 处理，避免两层重试叠加
+client.session.mount('https://', HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    max_retries=0,
+))
+# TiDB Serverless 会断开空闲连接，提前回收避免重试时拿到失效连接
+# 连接配置 (TIDB_* 环境变量、SSL) 统一在 db.py 中构建
+engine = engine_from_env(pool_pre_ping=True, pool_size=MAX_WORKERS, max_overflow=2,
+                         pool_recycle=280)
 
-def fetch_and_save_all():
-    # 每次拉取的大小
-    limit = 10000 
+def retry_delay(retry_count):
+    """指数退避 + 随机抖动，最长 60 秒，避免多个线程在同一时刻一起重试。"""
+    return min(60, 2 ** retry_count + random.random())
+
+def clean_batch(results, columns):
+    """把一页 Socrata 记录整理成可以写入 TiDB 的 DataFrame，columns 为已知的列顺序。"""
+    # 直接按已知列构造，不再每页重新推断列
+    batch_df = pd.DataFrame(results, columns=columns)
     
-    # 抓取过去 11 年 (2015 - 2025)
-    for year in range(2015, 2026):
-        print(f"\n🚀 --- 检查年份: {year} ---")
-        offset = 0
-        total_year_records = 0
-        
+    # 重要：移除包含字典的字段（如 'location'），否则会报 "dict can not be used as parameter"
+    # 这些复杂字段 SQL 无法直接处理
+    # if 'location' in batch_df.columns:
+    #     batch_df = batch_df.drop(columns=['location'])
+    # 转换 location 字段为 JSON 字符串
+    if 'location' in batch_df.columns:
+        mask = batch_df['location'].map(type) == dict
+        batch_df.loc[mask, 'location'] = batch_df.loc[mask, 'location'].map(json.dumps)
+    
+    batch_df.columns = batch_df.columns.str.upper()
+    if 'DATE' in batch_df.columns:
+        # Socrata 返回 ISO-8601 时间字符串，指定格式走快速解析；个别异常值记为空而不是让整批失败
+        batch_df['DATE'] = pd.to_datetime(batch_df['DATE'], format='ISO8601', cache=True, errors='coerce')
+    return batch_df
+
+def fetch_pages(year, offset, pages, stop):
+    """
+    生产者：从 offset 开始按顺序拉取该年的分页，放入 pages 队列。
+    拉完后放入 None；重试次数用尽时放入异常，由写入端抛出；写入端退出时置位 stop，生产者随之退出。
+    """
+    # SoQL 筛选
+    where_clause = f"date >= '{year}-01-01T00:00:00' and date <= '{year}-12-31T23:59:59'"
+    retry_count = 0
+
+    def put(item):
+        """带超时地放入队列并反复检查 stop，写入端不再取数据时返回 False。"""
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    while not stop.is_set():
+        try:
+            results = client.get(
+                DATASET_ID, 
+                where=where_clause, 
+                limit=PAGE_SIZE, 
+                offset=offset, 
+                order="date ASC"
+            )
+        except Exception as e:
+            retry_count += 1
+            print(f"❌ 拉取出错 (年份 {year}, 偏移量 {offset}): {e}")
+            if retry_count > 10:
+                put(e)
+                return
+            delay = retry_delay(retry_count)
+            print(f"⚠️ {year} 第 {retry_count} 次重试... 等待 {delay:.1f} 秒")
+            # 等待期间收到停止信号就不再重试
+            if stop.wait(delay):
+                return
+            continue
+
+        # 成功抓取一次后重置重试计数
+        retry_count = 0
+
+        if results and not put((offset, results)):
+            return
+        # 如果拉取的数量少于 PAGE_SIZE，说明这一年也抓完了
+        if len(results) < PAGE_SIZE:
+            put(None)
+            return
+        offset += len(results)
+
+def fetch_and_save_year(year):
+    """
+    拉取某一年的全部记录并写入 TiDB，返回该年累计的记录数。
+    后台线程预取接下来的分页，当前线程同时写库，API 请求和数据库写入互相重叠。
+    """
+    print(f"\n🚀 --- 检查年份: {year} ---")
+    offset = 0
+    total_year_records = 0
+    
+    # 整个年份复用同一个数据库连接 (断点查询 + 所有分页写入)，只做一次 TLS 握手
+    with engine.connect() as conn:
         # --- 断点续传逻辑 ---
+        # 以数据库中该年份的实际行数为断点：写库提交后中断、check_db.py 去重之后都能对上
+        # idx_year (migrations/002) 让这个 COUNT 只扫描该年份的索引范围
         try:
-            with engine.connect() as conn:
+            with conn.begin():
                 # 统计该年份已存在的行数
                 query = text("SELECT COUNT(*) FROM chicago_crimes WHERE YEAR = :year")
                 offset = conn.execute(query, {"year": str(year)}).scalar() or 0
         except Exception:
+            # 表还不存在 (第一次运行)
             offset = 0
-            
+        
         if offset > 0:
-            print(f"🔄 发现断点：该年份已存在 {offset} 条记录，将从此处继续抓取...")
+            print(f"🔄 {year} 发现断点：该年份已存在 {offset} 条记录，将从此处继续抓取...")
             total_year_records = offset
 
-        retry_count = 0
+        # 有界队列：最多预取 PREFETCH_PAGES 页，避免内存堆积
+        pages = queue.Queue(maxsize=PREFETCH_PAGES)
+        stop = threading.Event()
+        threading.Thread(target=fetch_pages, args=(year, offset, pages, stop), daemon=True).start()
 
-        
-        while True:
-            # SoQL 筛选
-            where_clause = f"date >= '{year}-01-01T00:00:00' and date <= '{year}-12-31T23:59:59'"
-            
-            try:
-                # 1. API 拉取
-                results = client.get(
-                    DATASET_ID, 
-                    where=where_clause, 
-                    limit=limit, 
-                    offset=offset, 
-                    order="date ASC"
-                )
-                
-                if not results:
+        # 列顺序以第一页为准 (Socrata 会省略值为空的字段，所以取整页所有记录的键)
+        columns = []
+
+        try:
+            while True:
+                # 其他年份已失败：不再写入后续分页
+                if stop_event.is_set():
+                    print(f"⏹️ {year} 收到停止信号，已存入 {offset} 条记录")
+                    return total_year_records
+                try:
+                    item = pages.get(timeout=1)
+                except queue.Empty:
+                    continue
+                if item is None:
                     break # 该年抓完
+                if isinstance(item, Exception):
+                    raise RuntimeError(f"{year} 拉取错误尝试超过 10 次 (偏移量 {offset})") from item
+
+                page_offset, results = item
+                # 后面的页出现新字段时追加到末尾，已有列的顺序保持不变
+                columns = list(dict.fromkeys([*columns, *(key for record in results for key in record)]))
+                batch_df = clean_batch(results, columns)
+
+                retry_count = 0
+                while True:
+                    try:
+                        # 写入 TiDB (多行 VALUES 批量插入，减少 TLS 往返)
+                        # 整页在一个显式事务里提交：每页只有一次 TiDB 提交，而不是每条 INSERT 一次
+                        with conn.begin():
+                            batch_df.to_sql("chicago_crimes", conn, if_exists='append', index=False,
+                                            chunksize=insert_chunksize(batch_df), method='multi')
+                        break
+                    except Exception as e:
+                        retry_count += 1
+                        print(f"❌ 写入出错 (年份 {year}, 偏移量 {page_offset}): {e}")
                 
-                # 2. 清洗
-                batch_df = pd.DataFrame.from_records(results)
-                
-                # 重要：移除包含字典的字段（如 'location'），否则会报 "dict can not be used as parameter"
-                # 这些复杂字段 SQL 无法直接处理
-                # if 'location' in batch_df.columns:
-                #     batch_df = batch_df.drop(columns=['location'])
-                # 转换 location 字段为 JSON 字符串
-                if 'location' in batch_df.columns:
-                    batch_df['location'] = batch_df['location'].apply(lambda x: json.dumps(x) if isinstance(x, dict) else x)
-                
-                batch_df.columns = [col.upper() for col in batch_df.columns]
-                if 'DATE' in batch_df.columns:
-                    batch_df['DATE'] = pd.to_datetime(batch_df['DATE'])
+                        if retry_count > 10:
+                            raise RuntimeError(f"{year} 写入错误尝试超过 10 次 (偏移量 {page_offset})") from e
                 
-                # 3. 写入 TiDB
-                batch_df.to_sql("chicago_crimes", engine, if_exists='append', index=False, chunksize=1000)
+                        delay = retry_delay(retry_count)
+                        print(f"⚠️ {year} 第 {retry_count} 次重试... 等待 {delay:.1f} 秒")
+                        time.sleep(delay)
 
-                
-                records_in_batch = len(results)
-                offset += records_in_batch
-                total_year_records += records_in_batch
+                offset = page_offset + len(results)
+                total_year_records += len(results)
                 print(f"✅ 进度: {year} 年已存入 {offset} 条记录")
-                
-                # 如果拉取的数量少于 limit，说明这一年也抓完了
-                if records_in_batch < limit:
-                    break
-                    
-            except Exception as e:
-                retry_count += 1
-                print(f"❌ 出错 (年份 {year}, 偏移量 {offset}): {e}")
-                
-                if retry_count > 10:
-                    print("🚫 错误尝试超过 10 次，停止脚本运行。请检查数据库连接或网络配置。")
-                    exit(1)
-                
-                print(f"⚠️ 第 {retry_count} 次重试... 等待 2 秒")
-                time.sleep(2)
-                continue
-                
-            # 成功抓取一次后重置重试计数
-            retry_count = 0 
+        finally:
+            # 写入端退出 (抓完、出错或收到停止信号) 时通知预取线程停止，它不会再阻塞在满队列上
+            stop.set()
 
-                
         print(f"✨ {year} 年抓取完毕，共计 {total_year_records} 条")
+        return total_year_records
+
+def fetch_and_save_all():
+    # 抓取过去 11 年 (2015 - 2025)，各年份由线程池并发抓取
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [executor.submit(fetch_and_save_year, year) for year in range(2015, 2026)]
+        try:
+            for future in as_completed(futures):
+                # 取结果以便把线程中的异常抛到主线程
+                future.result()
+        except Exception as e:
+            # 取消还没开始的年份，并通知正在运行的年份在当前分页后停止
+            stop_event.set()
+            executor.shutdown(cancel_futures=True)
+            print(f"🚫 {e}，停止脚本运行。请检查数据库连接或网络配置。")
+            sys.exit(1)
+
+    # 新数据写完后刷新看板用的汇总表
+    refresh_all(engine, CHICAGO_TABLES)
 
 if __name__ == "__main__":
     fetch_and_save_all()
\ No newline at end of file
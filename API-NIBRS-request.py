@@ -1,27 +1,53 @@
 import os
+import csv
 import time
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
-
-# 加载环境变量
-load_dotenv()
+import pyarrow as pa
+from pyarrow import csv as pacsv
+from sqlalchemy import text, inspect, MetaData, Table
+# 多行 INSERT 的行数由 db.insert_chunksize 按语句大小上限计算
+from db import engine_from_env, insert_chunksize
 
 # --- 配置信息 ---
 # Local Data Directory
 DATA_DIR = r"D:\NUS\IT5006\project\FBI data"
 
-# 数据库配置
-TIDB_USER = os.getenv("TIDB_USER")
-TIDB_PASSWORD = os.getenv("TIDB_PASSWORD")
-TIDB_HOST = os.getenv("TIDB_HOST")
-TIDB_PORT = os.getenv("TIDB_PORT")
-TIDB_DB_NAME = os.getenv("TIDB_DB_NAME")
-CA_PATH = os.getenv("TID_CA_PATH")
+# 并发导入的线程数；每个表线程持有一个连接，另留少量连接给反射表结构
+MAX_WORKERS = 8
+# local_infile: 允许 LOAD DATA LOCAL INFILE 从本机读取 CSV
+# pool_recycle: TiDB Serverless 会断开空闲连接，提前回收
+# 连接配置 (TIDB_* 环境变量、SSL) 统一在 db.py 中构建
+engine = engine_from_env(pool_pre_ping=True, pool_size=MAX_WORKERS, max_overflow=4, pool_recycle=280,
+                         connect_args={"local_infile": True})
+
+# 处理的年份 (IL-2015 到 IL-2024)
+YEARS = range(2015, 2025)
+
+# PyArrow 每次读取的块大小，一块约等于原来 pandas 的一个 chunk
+CSV_BLOCK_SIZE = 16 << 20
 
-# 构建连接字符串
-conn_str = f"mysql+pymysql://{TIDB_USER}:{TIDB_PASSWORD}@{TIDB_HOST}:{TIDB_PORT}/{TIDB_DB_NAME}?ssl_ca={CA_PATH}"
-engine = create_engine(conn_str)
+# 数据库列的 Python 类型 -> Arrow 类型，让 Arrow 直接按表结构解析 CSV
+# 整数列不在其中，按字符串读并由数据库转换：Arrow 的 int64 不接受 "1.0" 这类写法 (pandas 可以)，
+# 而按 float64 读又会让超过 2^53 的值丢失精度
+ARROW_TYPES = {float: pa.float64(), str: pa.string(), bool: pa.bool_()}
+
+def arrow_column_types(columns_info, csv_columns):
+    """
+    为 CSV 的每一列指定 Arrow 类型 (列名统一小写)，不依赖第一块数据的类型推断，
+    否则后面的块出现不同写法时会抛 ArrowInvalid。
+    表中没有或类型不在 ARROW_TYPES 里的列按字符串读，由数据库负责转换。
+    """
+    db_types = {}
+    for col in columns_info:
+        try:
+            arrow_type = ARROW_TYPES.get(col['type'].python_type)
+        except NotImplementedError:
+            arrow_type = None
+        if arrow_type is not None:
+            db_types[col['name'].lower()] = arrow_type
+    return {col: db_types.get(col, pa.string()) for col in csv_columns}
 
 # NIBRS 表列表 (根据 NIBRS 数据结构)
 NIBRS_TABLES = [
@@ -68,126 +94,209 @@ NIBRS_TABLES = [
     "nibrs_weapon_type"
 ]
 
-from sqlalchemy import create_engine, text, inspect
+def load_csv_infile(conn, table, csv_file_path, csv_columns, db_col_set, year):
+    """
+    用 LOAD DATA LOCAL INFILE 把 CSV 直接导入已存在的表，跳过 pandas 解析和逐批 INSERT。
+    空字段按 NULL 写入 (与 to_sql 写入 NaN 的行为一致)，返回导入的行数。
+    """
+    with open(csv_file_path, 'rb') as f:
+        line_end = '\\r\\n' if f.readline().endswith(b'\r\n') else '\\n'
+
+    variables = [f"@v{i}" for i in range(len(csv_columns))]
+    assignments = [f"`{col}` = NULLIF({var}, '')" for col, var in zip(csv_columns, variables)]
+    # CSV 中没有 data_year 时由年份补齐
+    if 'data_year' in db_col_set and 'data_year' not in csv_columns:
+        assignments.append(f"`data_year` = {int(year)}")
+
+    file_path = csv_file_path.replace('\\', '/').replace("'", "''")
+    sql = (
+        f"LOAD DATA LOCAL INFILE '{file_path}' INTO TABLE `{table}` "
+        f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+        f"LINES TERMINATED BY '{line_end}' IGNORE 1 LINES "
+        f"({', '.join(variables)}) SET {', '.join(assignments)}"
+    )
+    with conn.begin():
+        result = conn.exec_driver_sql(sql)
+    return result.rowcount
+
+@functools.lru_cache(maxsize=None)
+def reflect_table(table):
+    """
+    反射已存在的表，返回 (表对象, Core INSERT)。
+    按表名缓存：每张表只反射一次，各年份复用同一个 INSERT 语句。
+    """
+    table_obj = Table(table, MetaData(), autoload_with=engine)
+    return table_obj, table_obj.insert()
+
+def insert_arrow_batch(conn, table, batch, year):
+    """
+    用 SQLAlchemy Core 把一个 Arrow RecordBatch 写入已存在的表，返回写入的行数。
+    只保留表中存在的列 (严格模式)，整批在一个事务里 executemany 提交。
+    """
+    table_obj, insert_stmt = reflect_table(table)
+    data = pa.Table.from_batches([batch])
+    # 表列名 (小写) -> 实际列名
+    db_names = {col.name.lower(): col.name for col in table_obj.columns}
+
+    # 确保有一个 data_year 字段
+    if 'data_year' not in data.column_names and 'data_year' in db_names:
+        data = data.append_column('data_year', pa.array([year] * data.num_rows, pa.int64()))
+
+    valid_columns = [col for col in data.column_names if col in db_names]
+    rows = data.select(valid_columns).rename_columns([db_names[col] for col in valid_columns]).to_pylist()
+    if rows:
+        with conn.begin():
+            conn.execute(insert_stmt, rows)
+    return len(rows)
+
+def create_table_from_batch(conn, table, batch, year):
+    """表不存在时，用第一块数据通过 to_sql 建表并写入，返回写入的行数。"""
+    df = batch.to_pandas(types_mapper=pd.ArrowDtype)
+
+    # 确保有一个 data_year 字段
+    if 'data_year' not in df.columns:
+        df['data_year'] = year
+
+    # 建表和整块数据在同一个事务里提交，每块只有一次 TiDB 提交
+    with conn.begin():
+        df.to_sql(table, conn, if_exists='append', index=False,
+                  chunksize=insert_chunksize(df), method='multi')
+    return len(df)
+
+def ingest_table_year(conn, table, year, schemas):
+    """
+    读取某一年的一张表的 CSV 并通过 conn 上传到 TiDB，返回写入的记录数。
+    """
+    tag = f"[{table} {year}]"
+    csv_file_path = os.path.join(DATA_DIR, f"IL-{year}", f"{table}.csv")
+
+    if not os.path.exists(csv_file_path):
+        print(f"    ⚠️ {tag} 文件不存在: {csv_file_path}，跳过。")
+        return 0
+
+    print(f"  📂 {tag} 处理文件: {csv_file_path}")
+
+    # 表结构来自启动时的缓存
+    columns_info = schemas.get(table)
+    table_exists = columns_info is not None
+    db_columns = [col['name'] for col in columns_info] if table_exists else []
+
+    try:
+        # 1. 读取 CSV 数据
+        total_records = 0
+
+        # 只读前两行：拿到表头，并判断是否只有表头没有数据
+        with open(csv_file_path, 'rb') as f:
+            header_line = f.readline()
+            has_data = bool(f.readline().strip())
+        if not has_data:
+            print(f"    ⚠️ {tag} 文件为空或无数据，跳过。")
+            return 0
+
+        csv_columns = [col.lower() for col in next(csv.reader([header_line.decode('utf-8-sig')]), [])]
+        db_col_set = set([c.lower() for c in db_columns])
+
+        # 表已存在且 CSV 的列都能在表中找到：直接 LOAD DATA，不走 pandas
+        if table_exists and csv_columns and set(csv_columns) <= db_col_set:
+            start_time = time.time()
+            try:
+                total_records = load_csv_infile(conn, table, csv_file_path, csv_columns, db_col_set, year)
+                print(f"    🚚 {tag} LOAD DATA 导入 {total_records} 条记录 ({time.time() - start_time:.2f}s)")
+                print(f"    ✅ {tag} 完成，共处理 {total_records} 条记录。")
+                return total_records
+            except Exception as load_err:
+                print(f"    ⚠️ {tag} LOAD DATA 失败，改用 to_sql 写入: {load_err}")
+
+        # PyArrow 多线程按块解析 CSV；列名直接用小写后的表头
+        read_options = pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE, use_threads=True,
+                                         column_names=csv_columns, skip_rows=1)
+
+        # 新表：用第一块数据 (按推断的类型) 通过 to_sql 建表并写入，之后和已有表一样按表结构读取
+        rows_to_skip = 0
+        if not table_exists:
+            print(f"    🆕 {tag} (表不存在) 用第一块数据新建表...")
+            first_batch = pacsv.open_csv(csv_file_path, read_options=read_options).read_next_batch()
+            rows_to_skip = total_records = create_table_from_batch(conn, table, first_batch, year)
+            # 本次运行中新建的表，补充进缓存，后续年份按已有表处理
+            columns_info = schemas[table] = inspect(engine).get_columns(table)
+            db_col_set = {col['name'].lower() for col in columns_info}
+            print(f"    💾 {tag} Chunk 1: resource saved {total_records} records")
+
+        dropped = set(csv_columns) - db_col_set
+        if dropped:
+            print(f"    ℹ️ {tag} (表已存在) 丢弃 CSV 中多余的列: {dropped}")
+
+        # 每一列都按表结构指定类型，整个文件用同一套类型解析
+        reader = pacsv.open_csv(
+            csv_file_path,
+            read_options=read_options,
+            convert_options=pacsv.ConvertOptions(column_types=arrow_column_types(columns_info, csv_columns),
+                                                 strings_can_be_null=True),
+        )
+        for chunk_idx, batch in enumerate(reader):
+            # 新表建表时已写入的行不再重复写入
+            if rows_to_skip:
+                if batch.num_rows <= rows_to_skip:
+                    rows_to_skip -= batch.num_rows
+                    continue
+                batch, rows_to_skip = batch.slice(rows_to_skip), 0
 
-# ... (imports remain the same)
+            # 2. 写入 TiDB
+            start_time = time.time()
+            try:
+                # 已存在的表用 SQLAlchemy Core 直接写入
+                records_count = insert_arrow_batch(conn, table, batch, year)
+                cost = time.time() - start_time
+
+                total_records += records_count
+                print(f"    💾 {tag} Chunk {chunk_idx+1}: resource saved {records_count} records ({cost:.2f}s)")
+
+            except Exception as sql_err:
+                print(f"    ❌ {tag} 写入数据库失败 (Chunk {chunk_idx+1}): {sql_err}")
+                break
+
+        print(f"    ✅ {tag} 完成，共处理 {total_records} 条记录。")
+        return total_records
+
+    except Exception as e:
+        print(f"    ❌ {tag} 读取或处理文件失败: {e}")
+        return 0
+
+def ingest_table(table, schemas):
+    """
+    按年份顺序导入一张表。同一张表的各年份串行写入，避免多个线程同时建表。
+    所有年份共用一个数据库连接，每张表只做一次 TLS 握手。
+    """
+    with engine.connect() as conn:
+        return sum(ingest_table_year(conn, table, year, schemas) for year in YEARS)
 
 def process_and_upload_local_data():
     """
     遍历本地文件夹 (IL-2015 到 IL-2024)，读取 CSV 文件并上传到 TiDB。
+    不同的表由线程池并发导入，每个线程持有自己的连接。
     """
     inspector = inspect(engine)
 
-    # 遍历年份
-    for year in range(2015, 2025):
-        year_folder_name = f"IL-{year}"
-        year_dir_path = os.path.join(DATA_DIR, year_folder_name)
-        
-        print(f"\n🚀 --- 处理年份: {year} (文件夹: {year_folder_name}) ---")
-        
+    # 启动时一次性读取所有表结构，避免每个 (年份, 表) 都去查 information_schema
+    try:
+        schemas = {t: inspector.get_columns(t) for t in inspector.get_table_names()}
+    except Exception as e:
+        print(f"⚠️ Error loading table schemas: {e}")
+        schemas = {}
+
+    for year in YEARS:
+        year_dir_path = os.path.join(DATA_DIR, f"IL-{year}")
         if not os.path.exists(year_dir_path):
-             print(f"    ⚠️ 文件夹不存在: {year_dir_path}，跳过该年份。")
-             continue
-
-        # 遍历每张表
-        for table in NIBRS_TABLES:
-            csv_filename = f"{table}.csv"
-            csv_file_path = os.path.join(year_dir_path, csv_filename)
-            
-            print(f"  📂 处理表: {table} (文件: {csv_filename})")
-            
-            if not os.path.exists(csv_file_path):
-                print(f"    ⚠️ 文件不存在: {csv_file_path}，跳过。")
-                continue
-            
-            # Check table existence via Inspector
-            table_exists = False
-            db_columns = []
-            try:
-                # Refresh inspector implies just calling checks, but inspector object might cache? 
-                # Safer to verify existence directly or rely on engine.
-                if inspector.has_table(table):
-                    table_exists = True
-                    # Get columns
-                    columns_info = inspector.get_columns(table)
-                    db_columns = [col['name'] for col in columns_info]
-                    # print(f"    📋 Table found. Columns: {db_columns}")
-                else:
-                    # print(f"    🆕 Table {table} does not exist. Will create.")
-                    table_exists = False
-            except Exception as e:
-                print(f"    ⚠️ Error checking table {table}: {e}")
-                # Fallback to assuming not exists or connection issue
-                table_exists = False
+             print(f"⚠️ 文件夹不存在: {year_dir_path}，跳过该年份。")
 
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(ingest_table, table, schemas): table for table in NIBRS_TABLES}
+        for future in as_completed(futures):
+            table = futures[future]
             try:
-                # 1. 读取 CSV 数据
-                chunk_size = 10000
-                total_records = 0
-                
-                if os.path.getsize(csv_file_path) < 100:
-                     df_peek = pd.read_csv(csv_file_path, nrows=1)
-                     if df_peek.empty:
-                         print(f"    ⚠️ 文件为空或无数据，跳过。")
-                         continue
-
-                for chunk_idx, df in enumerate(pd.read_csv(csv_file_path, chunksize=chunk_size)):
-                    
-                    # 2. 清洗数据
-                    # 统一转小写
-                    df.columns = [col.lower() for col in df.columns]
-                    
-                    # 确保有一个 data_year 字段
-                    if 'data_year' not in df.columns:
-                        df['data_year'] = year
-
-                    df_final = df
-                    
-                    if table_exists:
-                        # 过滤列：只保留 DB 中存在的列 (严格模式)
-                        valid_columns = []
-                        db_col_set = set([c.lower() for c in db_columns])
-                        
-                        for col in df.columns:
-                            if col.lower() in db_col_set:
-                                valid_columns.append(col)
-                        
-                        df_final = df[valid_columns].copy()
-                        
-                        # DEBUG
-                        if chunk_idx == 0:
-                            dropped = set(df.columns) - set(valid_columns)
-                            if dropped:
-                                print(f"    ℹ️ (表已存在) 丢弃 CSV 中多余的列: {dropped}")
-                    else:
-                        if chunk_idx == 0:
-                            print(f"    🆕 (表不存在) 准备数据用于新建表...")
-
-                     # 处理复杂字段
-                    for col in df_final.columns:
-                        if df_final[col].dtype == 'object':
-                             df_final[col] = df_final[col].apply(lambda x: str(x) if isinstance(x, (list, dict)) else x)
-
-                    # 3. 写入 TiDB
-                    start_time = time.time()
-                    try:
-                        # if_exists='append': works for both new (creates) and existing.
-                        df_final.to_sql(table, engine, if_exists='append', index=False, chunksize=1000)
-                        cost = time.time() - start_time
-                        
-                        records_count = len(df_final)
-                        total_records += records_count
-                        print(f"    💾 Chunk {chunk_idx+1}: resource saved {records_count} records ({cost:.2f}s)")
-                        
-                    except Exception as sql_err:
-                        print(f"    ❌ 写入数据库失败 (Chunk {chunk_idx+1}): {sql_err}")
-                        break
-
-                print(f"    ✅ {table} {year} 完成，共处理 {total_records} 条记录。")
-
+                print(f"\n🚀 --- {table}: 所有年份完成，共 {future.result()} 条记录 ---")
             except Exception as e:
-                print(f"    ❌ 读取或处理文件失败: {e}")
-                continue
+                print(f"\n❌ --- {table}: 导入失败: {e} ---")
 
 if __name__ == "__main__":
     if not os.path.exists(DATA_DIR):
@@ -1,41 +1,59 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import text
+from sqlalchemy import Engine, bindparam, text
 import plotly.express as px
 
+# Cache settings shared by the dashboard queries. The engine is a cached resource,
+# so hashing it by identity is enough to key the cache.
+CACHE_TTL = 300
+ENGINE_HASH_FUNCS = {Engine: id}
+# Filter-keyed results: every slider/multiselect combination is a new entry, so bound the count
+CACHE_MAX_ENTRIES = 64
+
 # Common filter construction
 def _build_where_clause(age_range, selected_cats):
+    """Build a parameterized WHERE clause so the SQL text stays the same across filter changes."""
     conditions = []
+    params = {}
     if age_range:
-        conditions.append(f"age_num BETWEEN {age_range[0]} AND {age_range[1]}")
+        conditions.append("age_num BETWEEN :age_min AND :age_max")
+        params["age_min"], params["age_max"] = age_range[0], age_range[1]
     if selected_cats:
-        cats_list = "', '".join([c.replace("'", "''") for c in selected_cats]) # simple SQL injection prevention for names with quotes
-        conditions.append(f"offense_category_name IN ('{cats_list}')")
+        conditions.append("offense_category_name IN :cats")
+        params["cats"] = list(selected_cats)
     
     clause = "WHERE " + " AND ".join(conditions) if conditions else ""
-    return clause
+    return clause, params
+
+def _build_query(query, params):
+    """Wrap SQL in text(), expanding the category list into an IN (...) parameter list."""
+    stmt = text(query)
+    if "cats" in params:
+        stmt = stmt.bindparams(bindparam("cats", expanding=True))
+    return stmt
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_filter_metadata(engine):
-    """Fetch distinct categories and age range for initial UI setup."""
-    try:
-        with engine.connect() as conn:
-            # Optimized to get metadata only
-            # Get min/max age
-            age_query = text("SELECT MIN(age_num), MAX(age_num) FROM victim_offender_rel_analysis")
-            min_age, max_age = conn.execute(age_query).fetchone()
+    """
+    Fetch distinct categories and age range for initial UI setup.
+    Errors propagate uncached and are reported by the app's call site.
+    """
+    with engine.connect() as conn:
+        # Optimized to get metadata only
+        # Get min/max age
+        age_query = text("SELECT MIN(age_num), MAX(age_num) FROM victim_offender_rel_analysis")
+        min_age, max_age = conn.execute(age_query).fetchone()
             
-            # Get unique categories
-            cat_query = text("SELECT DISTINCT offense_category_name FROM victim_offender_rel_analysis ORDER BY offense_category_name")
-            categories = [row[0] for row in conn.execute(cat_query).fetchall() if row[0]]
+        # Get unique categories
+        cat_query = text("SELECT DISTINCT offense_category_name FROM victim_offender_rel_analysis ORDER BY offense_category_name")
+        categories = [row[0] for row in conn.execute(cat_query).fetchall() if row[0]]
             
-            return int(min_age) if min_age is not None else 0, int(max_age) if max_age is not None else 100, categories
-    except Exception as e:
-        st.error(f"Error fetching filter options: {e}")
-        return 0, 100, []
+        return int(min_age) if min_age is not None else 0, int(max_age) if max_age is not None else 100, categories
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS, max_entries=CACHE_MAX_ENTRIES)
 def get_kpi_data(engine, age_range, selected_cats):
     """Fetch aggregated KPI metrics directly from DB."""
-    where_clause = _build_where_clause(age_range, selected_cats)
+    where_clause, params = _build_where_clause(age_range, selected_cats)
     query = f"""
         SELECT 
             COUNT(*) as total_victims,
@@ -44,17 +62,14 @@ def get_kpi_data(engine, age_range, selected_cats):
         FROM victim_offender_rel_analysis
         {where_clause}
     """
-    try:
-        with engine.connect() as conn:
-            result = conn.execute(text(query)).fetchone()
-            return result
-    except Exception as e:
-        st.error(f"Error fetching KPIs: {e}")
-        return (0, 0, 0)
+    with engine.connect() as conn:
+        result = conn.execute(_build_query(query, params), params).fetchone()
+        return tuple(result)
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS, max_entries=CACHE_MAX_ENTRIES)
 def get_demographics_data(engine, age_range, selected_cats):
     """Fetch age and gender distribution."""
-    where_clause = _build_where_clause(age_range, selected_cats)
+    where_clause, params = _build_where_clause(age_range, selected_cats)
     query = f"""
         SELECT age_num, sex_code, COUNT(*) as count 
         FROM victim_offender_rel_analysis
@@ -62,59 +77,49 @@ def get_demographics_data(engine, age_range, selected_cats):
         GROUP BY age_num, sex_code
         ORDER BY age_num
     """
-    try:
-        with engine.connect() as conn:
-            return pd.read_sql(text(query), conn)
-    except Exception as e:
-        st.error(f"Error fetching demographics: {e}")
-        return pd.DataFrame()
+    with engine.connect() as conn:
+        return pd.read_sql(_build_query(query, params), conn, params=params)
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS, max_entries=CACHE_MAX_ENTRIES)
 def get_relationship_data(engine, age_range, selected_cats, limit=10):
     """Fetch top victim-offender relationships."""
-    where_clause = _build_where_clause(age_range, selected_cats)
+    where_clause, params = _build_where_clause(age_range, selected_cats)
     query = f"""
         SELECT RELATIONSHIP_NAME, COUNT(*) as count 
         FROM victim_offender_rel_analysis
         {where_clause}
         GROUP BY RELATIONSHIP_NAME
         ORDER BY count DESC
-        LIMIT {limit}
+        LIMIT :limit
     """
-    try:
-        with engine.connect() as conn:
-            return pd.read_sql(text(query), conn)
-    except Exception as e:
-        st.error(f"Error fetching relationships: {e}")
-        return pd.DataFrame()
+    params["limit"] = limit
+    with engine.connect() as conn:
+        return pd.read_sql(_build_query(query, params), conn, params=params)
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS, max_entries=CACHE_MAX_ENTRIES)
 def get_heatmap_data(engine, age_range, selected_cats):
-    """Fetch activity vs offense category heatmap data."""
-    where_clause = _build_where_clause(age_range, selected_cats)
+    """Fetch activity vs offense category heatmap data from the mv_activity_offense rollup."""
+    where_clause, params = _build_where_clause(age_range, selected_cats)
     query = f"""
-        SELECT victim_activity_at_incident, offense_category_name, COUNT(*) as count 
-        FROM victim_offender_rel_analysis
+        SELECT victim_activity_at_incident, offense_category_name, CAST(SUM(ct) AS SIGNED) as count 
+        FROM mv_activity_offense
         {where_clause}
         GROUP BY victim_activity_at_incident, offense_category_name
     """
-    try:
-        with engine.connect() as conn:
-            return pd.read_sql(text(query), conn)
-    except Exception as e:
-        st.error(f"Error fetching heatmap data: {e}")
-        return pd.DataFrame()
+    with engine.connect() as conn:
+        return pd.read_sql(_build_query(query, params), conn, params=params)
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS, max_entries=CACHE_MAX_ENTRIES)
 def get_raw_sample(engine, age_range, selected_cats, limit=100):
     """Fetch raw data sample."""
-    where_clause = _build_where_clause(age_range, selected_cats)
+    where_clause, params = _build_where_clause(age_range, selected_cats)
     query = f"""
         SELECT * 
         FROM victim_offender_rel_analysis
         {where_clause}
-        LIMIT {limit}
+        LIMIT :limit
     """
-    try:
-        with engine.connect() as conn:
-            return pd.read_sql(text(query), conn)
-    except Exception as e:
-        st.error(f"Error fetching raw sample: {e}")
-        return pd.DataFrame()
+    params["limit"] = limit
+    with engine.connect() as conn:
+        # Arrow-backed columns are decoded into typed buffers instead of boxed Python objects
+        return pd.read_sql(_build_query(query, params), conn, params=params, dtype_backend='pyarrow')
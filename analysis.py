@@ -1,387 +1,483 @@
+import numpy as np
 import pandas as pd
-from sqlalchemy import Engine, text
+from sqlalchemy import Engine, bindparam, text
+from sqlalchemy.exc import OperationalError
 import streamlit as st
 import plotly.express as px
 import requests
 import json
+import os
+import time
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-# Common date filter clause
-DATE_FILTER = "year >= 2015 AND year <= 2024"
+logger = logging.getLogger(__name__)
 
+# Common date filter clause (a range on the DATETIME column, so idx_date can serve it)
+DATE_FILTER = "date >= '2015-01-01' AND date < '2025-01-01'"
+# Years offered by the map selectors (same period as DATE_FILTER)
+ANALYSIS_YEARS = list(range(2015, 2025))
+
+# Cache settings for the dashboard queries. The engine is a cached resource,
+# so hashing it by identity is enough to key the cache.
+CACHE_TTL = 3600
+ENGINE_HASH_FUNCS = {Engine: id}
+
+# Attempts per read when TiDB drops the connection (Serverless times out idle/long connections)
+QUERY_RETRIES = 3
+# MySQL client errors for a lost or unreachable server: gone away, lost during query, can't connect.
+# pymysql also reports server errors (unknown column, missing table, ...) as OperationalError; those are not retried.
+TRANSIENT_ERRNOS = {2006, 2013, 2003}
+
+# Same period on the crime_daily_summary rollup (see migrations/008_split_crime_daily_summary.sql)
+DAILY_FILTER = "d >= '2015-01-01' AND d < '2025-01-01'"
+# ... and on the per-year rollups
+YEAR_FILTER = "year BETWEEN 2015 AND 2024"
+
+# Arrest / Domestic are stored as 1/0 or true/false depending on the column type;
+# label them 'True' / 'False' in SQL so the grouping keys are already strings
+def _bool_label(col):
+    return f"CASE WHEN LOWER(CAST({col} AS CHAR)) IN ('1', 'true') THEN 'True' ELSE 'False' END"
+
+# Dashboard summaries fetched in one round trip: bucket -> (source, key1, key2 grouping expressions).
+# Each bucket becomes one branch of a UNION ALL; keys are cast to CHAR so the branches line up.
+# The hour breakdown comes from agg_by_dow_hour, locations from the per-year location rollup,
+# everything else from the daily rollup.
+SUMMARY_BUCKETS = {
+    'yearly': ('daily', "YEAR(d)", "NULL"),
+    'monthly': ('daily', "MONTH(d)", "NULL"),
+    'dow': ('daily', "DAYOFWEEK(d)", "NULL"),
+    'hour_dow': ('dow_hour', "dow_hour", "NULL"),
+    'arrest': ('daily', _bool_label("arrest"), "NULL"),
+    'domestic': ('daily', _bool_label("domestic"), "NULL"),
+    'top_type': ('daily', "primary_type", _bool_label("arrest")),
+    'top_loc': ('location', "location_description", _bool_label("arrest")),
+    'type_year': ('daily', "primary_type", "YEAR(d)"),
+}
+
+# source -> (table, count expression, filter)
+SUMMARY_SOURCES = {
+    'daily': ("crime_daily_summary", "CAST(SUM(c) AS SIGNED)", DAILY_FILTER),
+    'location': ("crime_location_summary", "CAST(SUM(c) AS SIGNED)", YEAR_FILTER),
+    'dow_hour': ("agg_by_dow_hour", "CAST(SUM(cnt) AS SIGNED)", YEAR_FILTER),
+}
+
+# Chicago community-area boundaries, kept on local disk between app restarts
+GEOJSON_URL = "https://data.cityofchicago.org/resource/igwz-8jzy.geojson"
+GEOJSON_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "chicago_geojson.json")
+GEOJSON_MAX_AGE = 7 * 24 * 3600
+# Only the join key is needed by the choropleth; 4 decimals is ~10 m, finer than the map ever zooms
+GEOJSON_KEEP_PROPERTIES = ('area_numbe',)
+GEOJSON_PRECISION = 4
+_SESSION = requests.Session()
+
+# Columns shown in the Raw Data tab (LOCATION only repeats LATITUDE / LONGITUDE as JSON)
+RAW_COLUMNS = [
+    'ID', 'CASE_NUMBER', 'DATE', 'BLOCK', 'IUCR', 'PRIMARY_TYPE', 'DESCRIPTION', 'LOCATION_DESCRIPTION',
+    'ARREST', 'DOMESTIC', 'BEAT', 'DISTRICT', 'WARD', 'COMMUNITY_AREA', 'FBI_CODE',
+    'X_COORDINATE', 'Y_COORDINATE', 'YEAR', 'UPDATED_ON', 'LATITUDE', 'LONGITUDE',
+]
+# Low-cardinality raw columns, dictionary-encoded so the sample is smaller in the cache and on the wire
+RAW_CATEGORY_COLUMNS = ['PRIMARY_TYPE', 'DESCRIPTION', 'LOCATION_DESCRIPTION', 'ARREST', 'DOMESTIC']
+# Row counts offered by the Raw Data tab; the default is what the page loads (and prefetches) first
+RAW_PAGE_SIZES = [50, 100, 500, 1000]
+RAW_DEFAULT_PAGE_SIZE = 100
+
+# Community area number -> name, for the choropleth tooltips
+# Source: Chicago Data Portal / Wikipedia
+AREA_NAMES = pd.Series({
+    '1': 'Rogers Park', '2': 'West Ridge', '3': 'Uptown', '4': 'Lincoln Square', '5': 'North Center',
+    '6': 'Lake View', '7': 'Lincoln Park', '8': 'Near North Side', '9': 'Edison Park', '10': 'Norwood Park',
+    '11': 'Jefferson Park', '12': 'Forest Glen', '13': 'North Park', '14': 'Albany Park', '15': 'Portage Park',
+    '16': 'Irving Park', '17': 'Dunning', '18': 'Montclare', '19': 'Belmont Cragin', '20': 'Hermosa',
+    '21': 'Avondale', '22': 'Logan Square', '23': 'Humboldt Park', '24': 'West Town', '25': 'Austin',
+    '26': 'West Garfield Park', '27': 'East Garfield Park', '28': 'Near West Side', '29': 'North Lawndale', '30': 'South Lawndale',
+    '31': 'Lower West Side', '32': 'Loop', '33': 'Near South Side', '34': 'Armour Square', '35': 'Douglas',
+    '36': 'Oakland', '37': 'Fuller Park', '38': 'Grand Boulevard', '39': 'Kenwood', '40': 'Washington Park',
+    '41': 'Hyde Park', '42': 'Woodlawn', '43': 'South Shore', '44': 'Chatham', '45': 'Avalon Park',
+    '46': 'South Chicago', '47': 'Burnside', '48': 'Calumet Heights', '49': 'Roseland', '50': 'Pullman',
+    '51': 'South Deering', '52': 'East Side', '53': 'West Pullman', '54': 'Riverdale', '55': 'Hegewisch',
+    '56': 'Garfield Ridge', '57': 'archer Heights', '58': 'Brighton Park', '59': 'McKinley Park', '60': 'Bridgeport',
+    '61': 'New City', '62': 'West Elsdon', '63': 'Gage Park', '64': 'Clearing', '65': 'West Lawn',
+    '66': 'Chicago Lawn', '67': 'West Englewood', '68': 'Englewood', '69': 'Greater Grand Crossing', '70': 'Ashburn',
+    '71': 'Auburn Gresham', '72': 'Beverly', '73': 'Washington Heights', '74': 'Mount Greenwood', '75': 'Morgan Park',
+    '76': 'O\'Hare', '77': 'Edgewater'
+}, name='community_name')
+
+DAY_MAP = {1: 'Sun', 2: 'Mon', 3: 'Tue', 4: 'Wed', 5: 'Thu', 6: 'Fri', 7: 'Sat'}
+DAYS_ORDER = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+def _is_transient(e):
+    """True for a dropped or unreachable connection, as opposed to an error in the query itself."""
+    if e.connection_invalidated:
+        return True
+    args = getattr(e.orig, 'args', ())
+    return bool(args) and args[0] in TRANSIENT_ERRNOS
+
+def _retry_transient(fn):
+    """
+    Retries an idempotent read on a dropped or timed-out TiDB connection with exponential backoff.
+    Permanent errors are logged and re-raised to the caller at once; st.cache_data does not cache
+    a raised exception, so the next run queries again.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        for attempt in range(QUERY_RETRIES):
+            try:
+                return fn(*args, **kwargs)
+            except OperationalError as e:
+                if not _is_transient(e):
+                    logger.exception("%s failed", fn.__name__)
+                    raise
+                if attempt == QUERY_RETRIES - 1:
+                    logger.exception("%s failed after %d attempts", fn.__name__, QUERY_RETRIES)
+                    raise
+                logger.warning("%s: transient error, retrying (%d/%d): %s", fn.__name__, attempt + 1, QUERY_RETRIES, e)
+                time.sleep(min(2, 0.2 * 2 ** attempt))
+            except Exception:
+                logger.exception("%s failed", fn.__name__)
+                raise
+    return wrapper
+
+@_retry_transient
+def _read_records(engine, query, params=None):
+    """
+    Runs a small aggregate query and builds the frame straight from the result tuples,
+    skipping pd.read_sql's per-column type sniffing (the SQL already CASTs the counts).
+    """
+    with engine.connect() as conn:
+        result = conn.execute(query, params or {})
+        return pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()))
+
+@_retry_transient
+def _read_sql(engine, query, params=None, **kwargs):
+    """pd.read_sql on its own pooled connection, so a retry gets a fresh one."""
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn, params=params, **kwargs)
+
+def _summary_query():
+    """Builds the UNION ALL query with one GROUP BY branch per summary bucket."""
+    branches = []
+    for bucket, (source, key1, key2) in SUMMARY_BUCKETS.items():
+        table, count_expr, where = SUMMARY_SOURCES[source]
+        group_by = ", ".join(key for key in (key1, key2) if key != "NULL")
+        branches.append(
+            f"SELECT '{bucket}' AS bucket, CAST({key1} AS CHAR) AS k1, CAST({key2} AS CHAR) AS k2, {count_expr} AS count "
+            f"FROM {table} WHERE {where}" + (f" GROUP BY {group_by}" if group_by else "")
+        )
+    return "\nUNION ALL\n".join(branches)
+
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
+def fetch_all_summaries(engine):
+    """
+    Fetches every dashboard summary in a single query, tagged by a `bucket` column.
+    Errors propagate uncached and are reported by the app's call site (see streamlit_app.fetch).
+    """
+    return _read_records(engine, text(_summary_query()))
+
+def _summary(engine, bucket):
+    """Returns the rows of one bucket from the cached summary frame."""
+    df = fetch_all_summaries(engine)
+    return df[df['bucket'] == bucket]
+
+def _shrink(df, schema):
+    """Downcasts columns to narrow dtypes (e.g. year int16, counts int32) right after loading."""
+    return df.astype(schema)
+
+def _top_breakdown(engine, bucket, key_col, limit):
+    """Top N values of a `top_*` bucket by total count, broken down by arrest status."""
+    rows = _summary(engine, bucket)
+    result = pd.DataFrame({key_col: rows['k1'], 'arrest': rows['k2'], 'count': rows['count']})
+    # Missing keys can't be named on the chart nor matched by the heatmap's IN list
+    top_keys = result.groupby(key_col)['count'].sum().nlargest(limit).index
+    result = _shrink(result[result[key_col].isin(top_keys)], {'count': 'int32'})
+    return result.sort_values('count', ascending=False).reset_index(drop=True)
+
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_total_records(engine):
     """Fetches the total number of records in the chicago_crimes table for 2015-2024."""
-    try:
-        with engine.connect() as conn:
-            query = text(f"SELECT COUNT(*) FROM chicago_crimes WHERE {DATE_FILTER}")
-            result = conn.execute(query).scalar()
-            return result
-    except Exception as e:
-        st.error(f"Error fetching total records: {e}")
-        return 0
+    # The yearly bucket covers the same period, so its counts add up to the total
+    return int(_summary(engine, 'yearly')['count'].sum())
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_missing_values_summary(engine):
     """
-    Approximates missing values for key columns. 
+    Missing values for key columns over 2015-2024, read from the crime_missing_summary rollup
+    (per year and column, see migrations/006_crime_missing_summary.sql).
     """
-    try:
-        cols = ['x_coordinate', 'y_coordinate', 'latitude', 'longitude', 'location', 'location_description', 'ward', 'district']
-        
-        # We only check missing values for the relevant period to be accurate
-        selects = [f"COUNT(*) - COUNT({col}) as {col}_missing" for col in cols]
-        select_str = ", ".join(selects)
-        
-        with engine.connect() as conn:
-            query = text(f"SELECT COUNT(*) as total_rows, {select_str} FROM chicago_crimes WHERE {DATE_FILTER}")
-            result = conn.execute(query).fetchone()
-            
-            if result:
-                if hasattr(result, '_mapping'):
-                    data = dict(result._mapping)
-                else:
-                    keys = result.keys()
-                    data = {k: v for k, v in zip(keys, result)}
-                
-                total = data.pop('total_rows')
-                
-                summary_data = []
-                for col_key, missing_count in data.items():
-                    col_name = col_key.replace('_missing', '')
-                    summary_data.append({
-                        'Column': col_name,
-                        'Missing Count': missing_count,
-                        'Missing Rate (%)': round((missing_count / total * 100), 2) if total > 0 else 0
-                    })
-                
-                return pd.DataFrame(summary_data).sort_values('Missing Rate (%)', ascending=False)
-            return pd.DataFrame()
-            
-    except Exception as e:
-        st.error(f"Error fetching missing values: {e}")
+    query = text("""
+        SELECT column_name, CAST(SUM(total_rows) AS SIGNED) as total_rows, CAST(SUM(missing_count) AS SIGNED) as missing_count
+        FROM crime_missing_summary
+        WHERE year BETWEEN 2015 AND 2024
+        GROUP BY column_name
+    """)
+    df = _read_records(engine, query)
+
+    if df.empty:
         return pd.DataFrame()
 
+    total = df['total_rows']
+    rate = (df['missing_count'] / total.where(total > 0) * 100).round(2).fillna(0)
+    summary = pd.DataFrame({'Column': df['column_name'], 'Missing Count': df['missing_count'], 'Missing Rate (%)': rate})
+    return summary.sort_values('Missing Rate (%)', ascending=False)
+
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_arrest_domestic_stats(engine):
     """Fetches counts for Arrest and Domestic columns."""
-    stats = {}
-    try:
-        with engine.connect() as conn:
-            # Arrest Stats
-            query_arrest = text(f"SELECT arrest, COUNT(*) as count FROM chicago_crimes WHERE {DATE_FILTER} GROUP BY arrest")
-            arrest_res = conn.execute(query_arrest).fetchall()
-            stats['arrest'] = pd.DataFrame(arrest_res, columns=['Arrest', 'Count'])
-            if not stats['arrest'].empty:
-                stats['arrest']['Arrest'] = stats['arrest']['Arrest'].map({1: 'True', 0: 'False', 'true': 'True', 'false': 'False', True: 'True', False: 'False'})
-
-            # Domestic Stats
-            query_domestic = text(f"SELECT domestic, COUNT(*) as count FROM chicago_crimes WHERE {DATE_FILTER} GROUP BY domestic")
-            domestic_res = conn.execute(query_domestic).fetchall()
-            stats['domestic'] = pd.DataFrame(domestic_res, columns=['Domestic', 'Count'])
-            if not stats['domestic'].empty:
-                stats['domestic']['Domestic'] = stats['domestic']['Domestic'].map({1: 'True', 0: 'False', 'true': 'True', 'false': 'False', True: 'True', False: 'False'})
-                
-        return stats
-    except Exception as e:
-        st.error(f"Error fetching arrest/domestic stats: {e}")
-        return {'arrest': pd.DataFrame(), 'domestic': pd.DataFrame()}
+    arrest = _summary(engine, 'arrest')
+    domestic = _summary(engine, 'domestic')
+    return {
+        'arrest': _shrink(pd.DataFrame({'Arrest': arrest['k1'], 'Count': arrest['count']}), {'Count': 'int32'}).reset_index(drop=True),
+        'domestic': _shrink(pd.DataFrame({'Domestic': domestic['k1'], 'Count': domestic['count']}), {'Count': 'int32'}).reset_index(drop=True),
+    }
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_yearly_trends(engine):
     """Fetches crime counts grouped by year."""
-    try:
-        with engine.connect() as conn:
-            query = text(f"SELECT year, COUNT(*) as count FROM chicago_crimes WHERE {DATE_FILTER} GROUP BY year ORDER BY year")
-            result = pd.read_sql(query, conn)
-            return result
-    except Exception as e:
-        st.error(f"Error fetching yearly trends: {e}")
-        return pd.DataFrame()
+    rows = _summary(engine, 'yearly')
+    result = _shrink(pd.DataFrame({'year': rows['k1'].astype(int), 'count': rows['count']}), {'year': 'int16', 'count': 'int32'})
+    return result.sort_values('year').reset_index(drop=True)
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_monthly_trends(engine):
     """Fetches crime counts grouped by month (across all years)."""
-    try:
-        with engine.connect() as conn:
-            query = text(f"SELECT EXTRACT(MONTH FROM date) as month, COUNT(*) as count FROM chicago_crimes WHERE {DATE_FILTER} GROUP BY month ORDER BY month")
-            result = pd.read_sql(query, conn)
-            return result
-    except Exception as e:
-        st.error(f"Error fetching monthly trends: {e}")
-        return pd.DataFrame()
+    rows = _summary(engine, 'monthly').dropna(subset=['k1'])
+    result = _shrink(pd.DataFrame({'month': rows['k1'].astype(int), 'count': rows['count']}), {'month': 'int8', 'count': 'int32'})
+    return result.sort_values('month').reset_index(drop=True)
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_day_of_week_counts(engine):
-     """Fetches crime counts grouped by Day of Week."""
-     try:
-        with engine.connect() as conn:
-            query = text(f"""
-                SELECT DAYOFWEEK(date) as day_num, COUNT(*) as count 
-                FROM chicago_crimes 
-                WHERE {DATE_FILTER}
-                GROUP BY day_num
-            """)
-            df = pd.read_sql(query, conn)
-            
-            day_map = {1: 'Sun', 2: 'Mon', 3: 'Tue', 4: 'Wed', 5: 'Thu', 6: 'Fri', 7: 'Sat'}
-            df['Day'] = df['day_num'].map(day_map)
-            
-            # Sort Mon-Sun
-            days_order = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-            df = df.set_index('Day').reindex(days_order).reset_index()
-            return df
-     except Exception as e:
-        st.error(f"Error fetching day of week trends: {e}")
-        return pd.DataFrame()
+    """Fetches crime counts grouped by Day of Week."""
+    rows = _summary(engine, 'dow').dropna(subset=['k1'])
+    df = _shrink(pd.DataFrame({'day_num': rows['k1'].astype(int), 'count': rows['count']}), {'day_num': 'int8', 'count': 'int32'})
+    df['Day'] = df['day_num'].map(DAY_MAP)
+
+    # Sort Mon-Sun
+    df = df.set_index('Day').reindex(DAYS_ORDER).reset_index()
+    return df
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_heatmap_data(engine):
     """Fetches crime counts grouped by Day of Week and Hour."""
-    try:
-        with engine.connect() as conn:
-            query = text(f"""
-                SELECT 
-                    DAYOFWEEK(date) as day_of_week, 
-                    HOUR(date) as hour, 
-                    COUNT(*) as crime_count 
-                FROM chicago_crimes 
-                WHERE {DATE_FILTER}
-                GROUP BY day_of_week, hour
-            """)
-            df = pd.read_sql(query, conn)
-            
-            day_map = {1: 'Sun', 2: 'Mon', 3: 'Tue', 4: 'Wed', 5: 'Thu', 6: 'Fri', 7: 'Sat'}
-            df['Day'] = df['day_of_week'].map(day_map)
-            
-            heatmap_data = df.pivot(index='Day', columns='hour', values='crime_count').fillna(0)
-            days_order = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-            heatmap_data = heatmap_data.reindex(days_order)
-            
-            return heatmap_data
-    except Exception as e:
-        st.error(f"Error fetching heatmap data: {e}")
-        return pd.DataFrame()
+    rows = _summary(engine, 'hour_dow').dropna(subset=['k1'])
+    # dow_hour = (DAYOFWEEK - 1) * 24 + HOUR (see migrations/005_chicago_dow_hour.sql),
+    # so it is already the flat index into a Sun..Sat x 0..23 grid
+    grid = np.zeros(7 * 24, dtype=np.int32)
+    grid[rows['k1'].astype(int).to_numpy()] = rows['count'].to_numpy()
+    heatmap_data = pd.DataFrame(grid.reshape(7, 24), index=[DAY_MAP[d] for d in range(1, 8)], columns=range(24))
+    heatmap_data = heatmap_data.reindex(DAYS_ORDER)
 
+    return heatmap_data
+
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_top_crime_types_stacked(engine, limit=10):
     """Fetches top N primary crime types, broken down by arrest status."""
-    try:
-        with engine.connect() as conn:
-            # 1. Provide subquery for top types to avoid errors with limit inside IN clause
-            # MySQL 5.7+ / TiDB usually supports this, but nested select is safer
-            subquery = text(f"SELECT primary_type FROM chicago_crimes WHERE {DATE_FILTER} GROUP BY primary_type ORDER BY COUNT(*) DESC LIMIT {limit}")
-            top_types = [row[0] for row in conn.execute(subquery).fetchall()]
-            
-            if not top_types:
-                return pd.DataFrame()
-            
-            # 2. Get breakdown for these types
-            types_list = "', '".join([str(t).replace("'", "''") for t in top_types])
-            query = text(f"""
-                SELECT primary_type, arrest, COUNT(*) as count 
-                FROM chicago_crimes 
-                WHERE {DATE_FILTER} AND primary_type IN ('{types_list}')
-                GROUP BY primary_type, arrest
-                ORDER BY count DESC
-            """)
-            result = pd.read_sql(query, conn)
-            
-            # Ensure 'arrest' is a readable string label
-            result['arrest'] = result['arrest'].astype(str).replace({'1': 'True', '0': 'False', 'true': 'True', 'false': 'False', 'True': 'True', 'False': 'False'})
-            return result
-    except Exception as e:
-        st.error(f"Error fetching top crime types: {e}")
-        return pd.DataFrame()
+    return _top_breakdown(engine, 'top_type', 'primary_type', limit)
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_top_locations_stacked(engine, limit=10):
     """Fetches top N locations, broken down by arrest status."""
-    try:
-        with engine.connect() as conn:
-            # 1. Get top locations
-            subquery = text(f"SELECT location_description FROM chicago_crimes WHERE {DATE_FILTER} GROUP BY location_description ORDER BY COUNT(*) DESC LIMIT {limit}")
-            top_locs = [row[0] for row in conn.execute(subquery).fetchall()]
-            
-            if not top_locs:
-                return pd.DataFrame()
-
-            # 2. Get breakdown
-            locs_list = "', '".join([str(l).replace("'", "''") for l in top_locs])
-            query = text(f"""
-                SELECT location_description, arrest, COUNT(*) as count 
-                FROM chicago_crimes 
-                WHERE {DATE_FILTER} AND location_description IN ('{locs_list}')
-                GROUP BY location_description, arrest
-                ORDER BY count DESC
-            """)
-            result = pd.read_sql(query, conn)
-            
-             # Ensure 'arrest' is a readable string label
-            result['arrest'] = result['arrest'].astype(str).replace({'1': 'True', '0': 'False', 'true': 'True', 'false': 'False', 'True': 'True', 'False': 'False'})
-            return result
-    except Exception as e:
-        st.error(f"Error fetching top locations: {e}")
-        return pd.DataFrame()
+    return _top_breakdown(engine, 'top_loc', 'location_description', limit)
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_crime_location_heatmap(engine, top_types, top_locations):
     """Fetches heatmap data for Top Crimes vs Top Locations."""
-    try:
-        if not top_types or not top_locations:
-             return pd.DataFrame()
-        
-        # Safety for SQL IN clause
-        types_list = "', '".join([str(t).replace("'", "''") for t in top_types])
-        locs_list = "', '".join([str(l).replace("'", "''") for l in top_locations])
-        
-        with engine.connect() as conn:
-             query = text(f"""
-                SELECT primary_type, location_description, COUNT(*) as count
-                FROM chicago_crimes
-                WHERE {DATE_FILTER}
-                AND primary_type IN ('{types_list}')
-                AND location_description IN ('{locs_list}')
-                GROUP BY primary_type, location_description
-             """)
-             df = pd.read_sql(query, conn)
-             if df.empty:
-                 return pd.DataFrame()
-             
-             heatmap = df.pivot(index='primary_type', columns='location_description', values='count').fillna(0)
-             # Reorder to match input order if possible, roughly
-             return heatmap
-    except Exception as e:
-        st.error(f"Error fetching crime-location heatmap: {e}")
+    # Missing (NULL / NaN) keys can't be an IN match nor a heatmap category
+    types = [t for t in top_types if pd.notna(t)]
+    locs = [l for l in top_locations if pd.notna(l)]
+    if not types or not locs:
+         return pd.DataFrame()
+
+    # Expanding bind parameters: values are escaped by the driver and the SQL text stays the same
+    query = text(f"""
+        SELECT primary_type, location_description, CAST(SUM(c) AS SIGNED) as count
+        FROM crime_location_summary
+        WHERE {YEAR_FILTER}
+        AND primary_type IN :types
+        AND location_description IN :locs
+        GROUP BY primary_type, location_description
+    """).bindparams(bindparam("types", expanding=True), bindparam("locs", expanding=True))
+    df = _read_records(engine, query, {"types": types, "locs": locs})
+    if df.empty:
         return pd.DataFrame()
 
+    # Scatter the counts into a grid laid out in the input order
+    grid = np.zeros((len(types), len(locs)), dtype=np.int32)
+    grid[pd.Categorical(df['primary_type'], categories=types).codes,
+         pd.Categorical(df['location_description'], categories=locs).codes] = df['count'].to_numpy()
+    heatmap = pd.DataFrame(grid, index=pd.Index(types, name='primary_type'),
+                           columns=pd.Index(locs, name='location_description'))
+    return heatmap
+
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS)
 def get_top_crime_types_yearly(engine, limit=10):
     """Fetches yearly counts for crime types. If limit is None, fetches all."""
-    try:
-        with engine.connect() as conn:
-            # 1. Provide subquery for top types
-            if limit:
-                subquery = text(f"SELECT primary_type FROM chicago_crimes WHERE {DATE_FILTER} GROUP BY primary_type ORDER BY COUNT(*) DESC LIMIT {limit}")
-                top_types_res = conn.execute(subquery).fetchall()
-                top_types = [row[0] for row in top_types_res]
-                
-                if not top_types:
-                    return pd.DataFrame()
-                    
-                types_list = "', '".join([str(t).replace("'", "''") for t in top_types])
-                where_clause = f"AND primary_type IN ('{types_list}')"
-            else:
-                where_clause = ""
-
-            # 2. Get yearly breakdown
-            query = text(f"""
-                SELECT year, primary_type, COUNT(*) as count
-                FROM chicago_crimes
-                WHERE {DATE_FILTER} {where_clause}
-                GROUP BY year, primary_type
-                ORDER BY primary_type, year
-            """)
-            result = pd.read_sql(query, conn)
-            return result
-    except Exception as e:
-        st.error(f"Error fetching crime types yearly trends: {e}")
-        return pd.DataFrame()
+    rows = _summary(engine, 'type_year')
+    result = _shrink(pd.DataFrame({'year': rows['k2'].astype(int), 'primary_type': rows['k1'], 'count': rows['count']}),
+                     {'year': 'int16', 'count': 'int32'})
+    if limit:
+        top_types = result.groupby('primary_type')['count'].sum().nlargest(limit).index
+        result = result[result['primary_type'].isin(top_types)]
+    return result.sort_values(['primary_type', 'year']).reset_index(drop=True)
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS, max_entries=len(RAW_PAGE_SIZES))
 def get_recent_data(engine, limit=1000):
     """Fetches a sample of recent data."""
-    try:
-        with engine.connect() as conn:
-            # We assume user wants to see the latest data available, even if outside analysis range?
-            # Or should we strictly show 2024 data?
-            # Let's show recent data from the analyzed period (end of 2024)
-            query = text(f"SELECT * FROM chicago_crimes WHERE {DATE_FILTER} ORDER BY date DESC LIMIT {limit}")
-            result = pd.read_sql(query, conn)
-            return result
-    except Exception as e:
-        st.error(f"Error fetching recent data: {e}")
-        return pd.DataFrame()
+    # We assume user wants to see the latest data available, even if outside analysis range?
+    # Or should we strictly show 2024 data?
+    # Let's show recent data from the analyzed period (end of 2024)
+    query = text(f"SELECT {', '.join(RAW_COLUMNS)} FROM chicago_crimes WHERE {DATE_FILTER} ORDER BY date DESC LIMIT :limit")
+    # Arrow-backed columns are decoded into typed buffers instead of boxed Python objects
+    result = _read_sql(engine, query, {"limit": int(limit)}, dtype_backend='pyarrow')
+    return result.astype({col: 'category' for col in RAW_CATEGORY_COLUMNS if col in result.columns})
 
-def get_map_data(engine,selected_year, limit=100000):
-    """Fetches latitude and longitude for a sample of crimes."""
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS, max_entries=len(ANALYSIS_YEARS))
+def get_map_data(engine, selected_year, precision=3):
+    """
+    Fetches crime locations for one year, binned server-side on rounded lat/lon.
+    Returns one row per bin with its crime count (precision=3 is roughly a 100 m grid).
+    """
     #Show data group by the years - zyh 2026.02.10
+    query = text("""
+        SELECT ROUND(latitude, :precision) as latitude, ROUND(longitude, :precision) as longitude, COUNT(*) as count
+        FROM chicago_crimes
+        WHERE date >= :start AND date < :end
+        AND latitude IS NOT NULL AND longitude IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    params = {"precision": precision, "start": f"{int(selected_year)}-01-01", "end": f"{int(selected_year) + 1}-01-01"}
+    # float32 keeps ~1 m at Chicago's latitude, well inside the rounding grid
+    return _shrink(_read_sql(engine, query, params), {'latitude': 'float32', 'longitude': 'float32', 'count': 'int32'})
+
+def _round_coords(coords):
+    """Rounds a (nested) GeoJSON coordinate list to GEOJSON_PRECISION decimals."""
+    if coords and isinstance(coords[0], (int, float)):
+        return [round(c, GEOJSON_PRECISION) for c in coords]
+    return [_round_coords(c) for c in coords]
+
+def _slim_geojson(geojson):
+    """
+    Drops every feature property except the choropleth join key and rounds the polygon
+    coordinates, shrinking the payload Plotly serializes to the browser on each render.
+    """
+    for feature in geojson.get('features', []):
+        props = feature.get('properties') or {}
+        feature['properties'] = {k: props[k] for k in GEOJSON_KEEP_PROPERTIES if k in props}
+        geometry = feature.get('geometry')
+        if geometry and 'coordinates' in geometry:
+            geometry['coordinates'] = _round_coords(geometry['coordinates'])
+    return geojson
+
+@st.cache_resource
+def _load_geojson():
+    """
+    Loads the community-area GeoJSON, preferring a local copy younger than GEOJSON_MAX_AGE.
+    Errors are raised so a failed download is not cached.
+    """
+    if os.path.exists(GEOJSON_CACHE_PATH) and time.time() - os.path.getmtime(GEOJSON_CACHE_PATH) < GEOJSON_MAX_AGE:
+        with open(GEOJSON_CACHE_PATH, 'rb') as f:
+            return _slim_geojson(json.loads(f.read()))
+
+    resp = _SESSION.get(GEOJSON_URL, headers={"Accept-Encoding": "gzip"}, timeout=10)
+    resp.raise_for_status()
     try:
-        with engine.connect() as conn:
-            query = text(f"SELECT latitude, longitude FROM chicago_crimes WHERE YEAR = {selected_year} AND latitude IS NOT NULL AND longitude IS NOT NULL ORDER BY date DESC LIMIT {limit}")
-            result = pd.read_sql(query, conn)
-            # Ensure numeric types for map
-            result['latitude'] = pd.to_numeric(result['latitude'], errors='coerce')
-            result['longitude'] = pd.to_numeric(result['longitude'], errors='coerce')
-            result = result.dropna(subset=['latitude', 'longitude'])
-            return result
-    except Exception as e:
-        st.error(f"Error fetching map data: {e}")
-        return pd.DataFrame()
-    
+        os.makedirs(os.path.dirname(GEOJSON_CACHE_PATH), exist_ok=True)
+        with open(GEOJSON_CACHE_PATH, 'wb') as f:
+            f.write(resp.content)
+    except OSError:
+        pass  # Read-only filesystem: keep the in-memory copy only
+    return _slim_geojson(json.loads(resp.content))
 
 def get_geojson1():
-    url = "https://data.cityofchicago.org/resource/igwz-8jzy.geojson"
     try:
-        resp = requests.get(url)
-        return resp.json()
+        return _load_geojson()
     except Exception as e:
         st.error(f"GeoJSON Error: {e}")
         return None
 
-def draw_choropleth(engine, selected_year, limit=100000):
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=ENGINE_HASH_FUNCS, max_entries=len(ANALYSIS_YEARS))
+def draw_choropleth(engine, selected_year):
     """
     Draw choropleth map for crimes by community area.
     Now also includes Top 3 Crime Types for each area.
     """
-    try:
-        with engine.connect() as conn:
-            # Fetch detailed counts by area and type
-            query = f"""
-                SELECT community_area, primary_type, COUNT(*) as type_count 
-                FROM chicago_crimes 
-                WHERE YEAR = {selected_year}
-                AND community_area IS NOT NULL 
-                GROUP BY community_area, primary_type
-            """
-            df_detail = pd.read_sql(text(query), conn)
-            
-            if df_detail.empty:
-                return pd.DataFrame()
-
-            # 1. Calculate Total count per area
-            df_total = df_detail.groupby('community_area')['type_count'].sum().reset_index(name='crime_count')
-
-            # 2. Identify Top 5 Crime Types per area with Counts
-            # Sort by area (asc) and count (desc)
-            df_detail = df_detail.sort_values(['community_area', 'type_count'], ascending=[True, False])
-            
-            # Take top 5
-            df_top5 = df_detail.groupby('community_area').head(5)
-            
-            # Create formatted string like "Theft (500)<br>Battery (300)..."
-            # Using <br> for HTML tooltip if supported, or comma separated
-            df_top5['formatted'] = df_top5.apply(lambda x: f"{x['primary_type']} ({x['type_count']})", axis=1)
-            
-            df_str = df_top5.groupby('community_area')['formatted'].apply(lambda x: '<br>'.join(x)).reset_index(name='top_types')
-            
-            # 3. Merge results
-            final_df = pd.merge(df_total, df_str, on='community_area', how='left')
-            
-            # Ensure proper type for GeoJSON matching
-            final_df['community_area'] = final_df['community_area'].astype(int).astype(str)
-            
-            # Map Area Number to Name
-            # Source: Chicago Data Portal / Wikipedia
-            area_names = {
-                '1': 'Rogers Park', '2': 'West Ridge', '3': 'Uptown', '4': 'Lincoln Square', '5': 'North Center',
-                '6': 'Lake View', '7': 'Lincoln Park', '8': 'Near North Side', '9': 'Edison Park', '10': 'Norwood Park',
-                '11': 'Jefferson Park', '12': 'Forest Glen', '13': 'North Park', '14': 'Albany Park', '15': 'Portage Park',
-                '16': 'Irving Park', '17': 'Dunning', '18': 'Montclare', '19': 'Belmont Cragin', '20': 'Hermosa',
-                '21': 'Avondale', '22': 'Logan Square', '23': 'Humboldt Park', '24': 'West Town', '25': 'Austin',
-                '26': 'West Garfield Park', '27': 'East Garfield Park', '28': 'Near West Side', '29': 'North Lawndale', '30': 'South Lawndale',
-                '31': 'Lower West Side', '32': 'Loop', '33': 'Near South Side', '34': 'Armour Square', '35': 'Douglas',
-                '36': 'Oakland', '37': 'Fuller Park', '38': 'Grand Boulevard', '39': 'Kenwood', '40': 'Washington Park',
-                '41': 'Hyde Park', '42': 'Woodlawn', '43': 'South Shore', '44': 'Chatham', '45': 'Avalon Park',
-                '46': 'South Chicago', '47': 'Burnside', '48': 'Calumet Heights', '49': 'Roseland', '50': 'Pullman',
-                '51': 'South Deering', '52': 'East Side', '53': 'West Pullman', '54': 'Riverdale', '55': 'Hegewisch',
-                '56': 'Garfield Ridge', '57': 'archer Heights', '58': 'Brighton Park', '59': 'McKinley Park', '60': 'Bridgeport',
-                '61': 'New City', '62': 'West Elsdon', '63': 'Gage Park', '64': 'Clearing', '65': 'West Lawn',
-                '66': 'Chicago Lawn', '67': 'West Englewood', '68': 'Englewood', '69': 'Greater Grand Crossing', '70': 'Ashburn',
-                '71': 'Auburn Gresham', '72': 'Beverly', '73': 'Washington Heights', '74': 'Mount Greenwood', '75': 'Morgan Park',
-                '76': 'O\'Hare', '77': 'Edgewater'
-            }
-            final_df['community_name'] = final_df['community_area'].map(area_names).fillna('Unknown')
-            
-            return final_df
+    # Fetch detailed counts by area and type
+    # crime_area_summary already carries community_area x primary_type per year
+    query = """
+        SELECT community_area, primary_type, CAST(SUM(c) AS SIGNED) as type_count 
+        FROM crime_area_summary 
+        WHERE year = :year
+        AND community_area IS NOT NULL 
+        GROUP BY community_area, primary_type
+    """
+    params = {"year": int(selected_year)}
+    df_detail = _read_sql(engine, text(query), params)
 
-    except Exception as e:
-        st.error(f"Error fetching choropleth data: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+    if df_detail.empty:
+        return pd.DataFrame()
+
+    # 1. Calculate Total count per area
+    df_total = df_detail.groupby('community_area')['type_count'].sum().reset_index(name='crime_count')
+
+    # 2. Identify Top 5 Crime Types per area with Counts
+    # Sort by area (asc) and count (desc)
+    df_detail = df_detail.sort_values(['community_area', 'type_count'], ascending=[True, False])
+
+    # Take top 5
+    df_top5 = df_detail.groupby('community_area').head(5)
+
+    # Create formatted string like "Theft (500)<br>Battery (300)..."
+    # Using <br> for HTML tooltip if supported, or comma separated
+    df_top5 = df_top5.assign(formatted=df_top5['primary_type'].astype(str) + ' (' + df_top5['type_count'].astype(str) + ')')
+
+    df_str = df_top5.groupby('community_area')['formatted'].agg('<br>'.join).reset_index(name='top_types')
+
+    # 3. Merge results
+    final_df = pd.merge(df_total, df_str, on='community_area', how='left')
+
+    # Ensure proper type for GeoJSON matching
+    final_df['community_area'] = final_df['community_area'].astype(int).astype(str)
+
+    # Map Area Number to Name
+    final_df['community_name'] = AREA_NAMES.reindex(final_df['community_area']).fillna('Unknown').values
+
+    return final_df
+
+# Independent queries behind the first page load; arguments must match the app's calls
+# so the warmed cache entries are the ones the tabs read.
+PREFETCH_QUERIES = {
+    'summaries': lambda engine: fetch_all_summaries(engine),
+    'missing': lambda engine: get_missing_values_summary(engine),
+    'recent': lambda engine: get_recent_data(engine, limit=RAW_DEFAULT_PAGE_SIZE),
+    # Geo tab defaults: latest year on the heatmap, first vs latest year on the choropleths
+    'map': lambda engine: get_map_data(engine, ANALYSIS_YEARS[-1]),
+    'choropleth_a': lambda engine: draw_choropleth(engine, ANALYSIS_YEARS[0]),
+    'choropleth_b': lambda engine: draw_choropleth(engine, ANALYSIS_YEARS[-1]),
+}
+
+def prefetch_all(engine):
+    """
+    Runs the independent dashboard queries concurrently to warm their caches,
+    so a cold page load waits for the slowest query instead of the sum of all of them.
+    Each worker takes its own pooled connection. Returns {name: result} for the queries that succeeded.
+    """
+    ctx = get_script_run_ctx()
+
+    def run(fn):
+        # Attach the session context so caching behaves as on the main thread
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(engine)
+
+    with ThreadPoolExecutor(max_workers=len(PREFETCH_QUERIES)) as executor:
+        futures = {name: executor.submit(run, fn) for name, fn in PREFETCH_QUERIES.items()}
+
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception:
+            pass  # Not cached; the tab's own call re-runs the query and reports the error
+    return results
@@ -1,20 +1,20 @@
-import os
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from db import engine_from_env
+from refresh_summaries import refresh_all, CHICAGO_TABLES
 
-load_dotenv()
+# 连接到指定数据库 (配置见 .env，连接字符串由 db.py 构建)
+engine = engine_from_env()
 
-TIDB_USER = os.getenv("TIDB_USER")
-TIDB_PASSWORD = os.getenv("TIDB_PASSWORD")
-TIDB_HOST = os.getenv("TIDB_HOST")
-TIDB_PORT = os.getenv("TIDB_PORT")
-CA_PATH = os.getenv("TID_CA_PATH")
-
-TIDB_DB_NAME = os.getenv("TIDB_DB_NAME") or "Chicago_data"
-
-# 连接到指定数据库
-url = f"mysql+pymysql://{TIDB_USER}:{TIDB_PASSWORD}@{TIDB_HOST}:{TIDB_PORT}/{TIDB_DB_NAME}?ssl_ca={CA_PATH}"
-engine = create_engine(url)
+def add_index(conn, ddl):
+    """执行建索引语句；索引已存在 (1061 Duplicate key name) 时跳过，其他错误照常抛出。"""
+    try:
+        conn.execute(text(ddl))
+    except DBAPIError as e:
+        conn.rollback()
+        if e.orig is None or e.orig.args[0] != 1061:
+            raise
+        print("索引已存在，跳过创建")
 
 with engine.connect() as conn:
     # 1. 检查数据库列表
@@ -24,7 +24,7 @@ with engine.connect() as conn:
         print(f"- {row[0]}")
     
     # 2. 检查数据表
-    print(f"\n--- 2. {TIDB_DB_NAME} 中的表 ---")
+    print(f"\n--- 2. {engine.url.database} 中的表 ---")
     tables = conn.execute(text("SHOW TABLES"))
     has_table = False
     for row in tables:
@@ -55,58 +55,41 @@ with engine.connect() as conn:
             confirm = input("是否执行清理（保留唯一记录）? (y/n): ")
             if confirm.lower() == 'y':
                 print("正在清理重复项，请稍候...")
-                # 方案 C：分批次插入 + 禁用 strict mode
-                # 大数据量 (300万行) 一次性 INSERT ... GROUP BY 容易导致 TiDB Serverless 超时 (Lost connection)
-                # 我们改为分批次搬运数据
-                conn.execute(text("SET SESSION sql_mode=(SELECT REPLACE(@@sql_mode,'ONLY_FULL_GROUP_BY',''))"))
-                
-                conn.execute(text("DROP TABLE IF EXISTS chicago_crimes_temp"))
-                conn.execute(text("CREATE TABLE chicago_crimes_temp LIKE chicago_crimes"))
-                
-                # 获取总行数，用于进度条
-                total_rows = conn.execute(text("SELECT COUNT(*) FROM chicago_crimes")).scalar()
+                # ID 是 to_sql 建的 TEXT 列，不能直接建索引：先改成定长 VARCHAR (Chicago 的 ID 不超过 8 位)
+                conn.execute(text("ALTER TABLE chicago_crimes MODIFY ID VARCHAR(16)"))
+                # 先建普通索引，下面每一批自连接都按 ID 走索引，而不是全表扫描
+                add_index(conn, "ALTER TABLE chicago_crimes ADD INDEX idx_id (ID)")
+                # 原地去重：不再复制整张表到 temp 表，只删除重复的行
+                # 表没有主键，TiDB 用隐藏的 _tidb_rowid 区分行；同一 ID 保留 rowid 最小 (最早写入) 的那条
+                # 一次删除太多行容易导致 TiDB Serverless 超时 (Lost connection)，所以分批删除
                 batch_size = 50000
-                print(f"开始分批处理，每批 {batch_size} 条，预计 {total_rows // batch_size + 1} 批...")
-                
-                
-                # 修正后的策略：
-                # 1. 创建 temp 表
-                # 2. 给 temp 表的 ID 加上 UNIQUE 索引 (如果原表没有)
-                # 3. 分批 INSERT IGNORE 由于 ID 重复会被忽略
-
-                
-                try:
-                    conn.execute(text("ALTER TABLE chicago_crimes_temp ADD UNIQUE INDEX idx_id_unique (ID)"))
-                except Exception as e:
-                    print("索引可能已存在，跳过创建")
-
-                offset = 0
+                deleted = 0
                 while True:
-                    # 使用 INSERT IGNORE ... SELECT ... LIMIT ...
-                    # 注意：TiDB/MySQL 的 INSERT IGNORE ... SELECT ... LIMIT 有时不支持 OFFSET
-                    # 更稳妥的是：每次读一批，在 Python 里不做处理，直接 INSERT IGNORE 到库里? 不，那样网络开销大。
-                    
-                    # 让我们尝试纯 SQL 的分批：
-                    # INSERT IGNORE INTO temp SELECT * FROM source LIMIT 50000 OFFSET 0;
-                    result = conn.execute(text(f"""
-                        INSERT IGNORE INTO chicago_crimes_temp 
-                        SELECT * FROM chicago_crimes LIMIT {batch_size} OFFSET {offset}
-                    """))
+                    result = conn.execute(text("""
+                        DELETE FROM chicago_crimes WHERE _tidb_rowid IN (
+                            SELECT rid FROM (
+                                SELECT c1._tidb_rowid AS rid
+                                FROM chicago_crimes c1
+                                JOIN chicago_crimes c2 ON c1.ID = c2.ID AND c1._tidb_rowid > c2._tidb_rowid
+                                LIMIT :batch_size
+                            ) t
+                        )
+                    """), {"batch_size": batch_size})
                     conn.commit() # 每批提交
                     
                     rows = result.rowcount
-                    offset += batch_size
-                    print(f"已处理偏移量 {offset}...")
-                    
                     if rows == 0:
                         break
+                    deleted += rows
+                    print(f"已删除 {deleted} 条重复记录...")
 
-                conn.execute(text("DROP TABLE chicago_crimes"))
-                conn.execute(text("ALTER TABLE chicago_crimes_temp RENAME TO chicago_crimes"))
-                
+                # 加上唯一索引，之后重复写入会直接报错，而不是悄悄产生重复数据；唯一索引建好后普通索引就多余了
+                add_index(conn, "ALTER TABLE chicago_crimes ADD UNIQUE INDEX idx_id_unique (ID)")
+                conn.execute(text("ALTER TABLE chicago_crimes DROP INDEX IF EXISTS idx_id"))
                 conn.commit()
 
-
+                # 删除的重复行也计入了汇总表，重新生成看板用的 Chicago 汇总表
+                refresh_all(engine, CHICAGO_TABLES)
 
                 print("✅ 清理完成！")
         
@@ -0,0 +1,35 @@
+import os
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+
+# pymysql inlines the parameters into the SQL text and sends it as one packet; its client-side
+# max_allowed_packet is 16 MB, so keep each multi-row INSERT a quarter below that
+MAX_PACKET_BYTES = 12 * 1024 * 1024
+# Multi-row INSERTs of roughly 200-500 rows give the best throughput on TiDB
+MAX_ROWS_PER_INSERT = 500
+
+def tidb_url(user, password, host, port, db_name, ca_path):
+    """pymysql URL for TiDB Cloud; TLS uses the given CA file."""
+    return f"mysql+pymysql://{user}:{password}@{host}:{port}/{db_name or 'Chicago_data'}?ssl_ca={ca_path}"
+
+def engine_from_env(**engine_kwargs):
+    """
+    Engine for the command-line scripts (ingest, rollup refresh, dedup), configured from .env.
+    Pool settings differ per script, so they are passed through to create_engine.
+    """
+    load_dotenv()
+    url = tidb_url(os.getenv("TIDB_USER"), os.getenv("TIDB_PASSWORD"), os.getenv("TIDB_HOST"),
+                   os.getenv("TIDB_PORT"), os.getenv("TIDB_DB_NAME"), os.getenv("TID_CA_PATH"))
+    return create_engine(url, **engine_kwargs)
+
+def insert_chunksize(df, sample_rows=1000):
+    """
+    Rows per multi-row INSERT for the ingest scripts' to_sql calls, capped at MAX_ROWS_PER_INSERT.
+    The encoded row size is estimated from the values' text form (plus quotes and separators)
+    over a sample, taking the largest row, so one statement stays under MAX_PACKET_BYTES.
+    """
+    if df.empty:
+        return MAX_ROWS_PER_INSERT
+    sample = df.head(sample_rows).astype(str)
+    row_bytes = sum(sample[col].str.encode('utf-8').str.len() + 4 for col in sample.columns)
+    return max(1, min(MAX_ROWS_PER_INSERT, MAX_PACKET_BYTES // max(1, int(row_bytes.max()))))
@@ -0,0 +1,14 @@
+-- Victim Risk Analysis tab (NIBRSAnalysis.py)
+-- Every dashboard query filters victim_offender_rel_analysis on age_num + offense_category_name.
+
+CREATE INDEX idx_vor_age_cat
+    ON victim_offender_rel_analysis (age_num, offense_category_name(100), sex_code(10), RELATIONSHIP_NAME(100));
+
+-- Rollup for the activity vs offense heatmap; rebuilt by refresh_summaries.py
+CREATE TABLE IF NOT EXISTS mv_activity_offense (
+    victim_activity_at_incident VARCHAR(255),
+    offense_category_name VARCHAR(255),
+    age_num INT,
+    ct BIGINT NOT NULL,
+    KEY idx_mv_age_cat (age_num, offense_category_name)
+);
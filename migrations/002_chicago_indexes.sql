@@ -0,0 +1,13 @@
+-- Chicago dashboard (analysis.py)
+-- chicago_crimes is created by to_sql, so the text columns are TEXT and need index prefix lengths.
+-- DATE is DATETIME: the dashboard filters on a DATE range, which an ordinary B-tree can serve.
+
+CREATE INDEX idx_date ON chicago_crimes (DATE);
+CREATE INDEX idx_year ON chicago_crimes (YEAR(4));
+CREATE INDEX idx_year_type ON chicago_crimes (YEAR(4), PRIMARY_TYPE(64));
+CREATE INDEX idx_year_loc ON chicago_crimes (YEAR(4), LOCATION_DESCRIPTION(100));
+
+-- Functional indexes on DAYOFWEEK(DATE) / HOUR(DATE) need MySQL 8.0.13+.
+-- TiDB only allows a short list of functions in expression indexes and rejects these two.
+-- CREATE INDEX idx_dow ON chicago_crimes ((DAYOFWEEK(DATE)));
+-- CREATE INDEX idx_hour ON chicago_crimes ((HOUR(DATE)));
@@ -0,0 +1,12 @@
+-- Daily rollup of chicago_crimes for the Chicago dashboard; rebuilt by refresh_summaries.py
+-- arrest / domestic are stored as text so both 1/0 and true/false source values fit.
+CREATE TABLE IF NOT EXISTS crime_daily_summary (
+    d DATE NOT NULL,
+    primary_type VARCHAR(64),
+    location_description VARCHAR(128),
+    community_area VARCHAR(8),
+    arrest VARCHAR(8),
+    domestic VARCHAR(8),
+    c INT NOT NULL,
+    KEY idx_cds_d (d)
+);
@@ -0,0 +1,5 @@
+-- Columnar replicas for the dashboard scans (TiDB only).
+-- The optimizer sends full-scan GROUP BY queries to TiFlash on its own, reading only the columns they touch.
+-- Replication runs in the background; progress: SELECT * FROM information_schema.tiflash_replica;
+ALTER TABLE chicago_crimes SET TIFLASH REPLICA 1;
+ALTER TABLE victim_offender_rel_analysis SET TIFLASH REPLICA 1;
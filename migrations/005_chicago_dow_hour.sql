@@ -0,0 +1,4 @@
+-- Weekday/hour bucket for the Hour vs Day heatmap: (DAYOFWEEK - 1) * 24 + HOUR, 0 = Sunday 00:00 ... 167 = Saturday 23:00.
+-- TiDB cannot add a STORED generated column to an existing table; a VIRTUAL column plus an index serves the same query.
+ALTER TABLE chicago_crimes ADD COLUMN dow_hour TINYINT UNSIGNED AS ((DAYOFWEEK(DATE) - 1) * 24 + HOUR(DATE)) VIRTUAL;
+CREATE INDEX idx_date_dow_hour ON chicago_crimes (DATE, dow_hour);
@@ -0,0 +1,8 @@
+-- Missing-value counts per year and column for the Overview tab; rebuilt by refresh_summaries.py
+CREATE TABLE IF NOT EXISTS crime_missing_summary (
+    year SMALLINT,
+    column_name VARCHAR(64) NOT NULL,
+    total_rows INT NOT NULL,
+    missing_count INT NOT NULL,
+    KEY idx_cms_year (year)
+);
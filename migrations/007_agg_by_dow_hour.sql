@@ -0,0 +1,7 @@
+-- Crimes per year and weekday/hour bucket (dow_hour, see 005) for the Hour vs Day heatmap; rebuilt by refresh_summaries.py
+CREATE TABLE IF NOT EXISTS agg_by_dow_hour (
+    year SMALLINT NOT NULL,
+    dow_hour TINYINT UNSIGNED NOT NULL,
+    cnt INT NOT NULL,
+    PRIMARY KEY (year, dow_hour)
+);
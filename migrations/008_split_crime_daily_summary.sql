@@ -0,0 +1,33 @@
+-- Splits the crime_daily_summary rollup from 003. Grouped by day x type x location x community area x arrest x domestic,
+-- nearly every crime was its own group, so the rollup was about as large as chicago_crimes.
+-- Each dashboard breakdown now reads the coarsest table that carries its keys; all three are rebuilt by refresh_summaries.py.
+DROP TABLE IF EXISTS crime_daily_summary;
+
+-- Per day: yearly / monthly / weekday trends, arrest and domestic shares, crime types by arrest and by year
+CREATE TABLE crime_daily_summary (
+    d DATE NOT NULL,
+    primary_type VARCHAR(64),
+    arrest VARCHAR(8),
+    domestic VARCHAR(8),
+    c INT NOT NULL,
+    KEY idx_cds_d (d)
+);
+
+-- Per year: locations by arrest and the crime type x location heatmap
+CREATE TABLE IF NOT EXISTS crime_location_summary (
+    year SMALLINT NOT NULL,
+    primary_type VARCHAR(64),
+    location_description VARCHAR(128),
+    arrest VARCHAR(8),
+    c INT NOT NULL,
+    KEY idx_cls_year (year)
+);
+
+-- Per year: community-area choropleth with its top crime types
+CREATE TABLE IF NOT EXISTS crime_area_summary (
+    year SMALLINT NOT NULL,
+    community_area VARCHAR(8),
+    primary_type VARCHAR(64),
+    c INT NOT NULL,
+    KEY idx_cas_year (year)
+);
@@ -0,0 +1,108 @@
+import time
+from sqlalchemy import text
+from db import engine_from_env
+
+# 统计缺失值的列 (与看板 Overview 页一致)
+MISSING_COLUMNS = ['x_coordinate', 'y_coordinate', 'latitude', 'longitude', 'location', 'location_description', 'ward', 'district']
+
+# Chicago 汇总表每次只重算一年：:start / :end 为该年的日期范围
+YEAR_RANGE = "date >= :start AND date < :end"
+
+def missing_summary_sql():
+    """一次扫描按年统计各列的空值数，再用 CTE 展开成 (年份, 列名) 行。"""
+    counts = ", ".join(f"SUM(CASE WHEN {col} IS NULL THEN 1 ELSE 0 END) AS {col}" for col in MISSING_COLUMNS)
+    rows = "\n        UNION ALL ".join(f"SELECT y, '{col}', total, {col} FROM m" for col in MISSING_COLUMNS)
+    return f"""
+        INSERT INTO crime_missing_summary (year, column_name, total_rows, missing_count)
+        WITH m AS (SELECT YEAR(date) AS y, COUNT(*) AS total, {counts} FROM chicago_crimes WHERE {YEAR_RANGE} GROUP BY YEAR(date))
+        {rows}
+    """
+
+# 汇总表 -> 重新生成该表的 INSERT ... SELECT
+# 表结构见 migrations/ 目录，建议每晚运行一次本脚本
+SUMMARY_TABLES = {
+    "mv_activity_offense": """
+        INSERT INTO mv_activity_offense (victim_activity_at_incident, offense_category_name, age_num, ct)
+        SELECT victim_activity_at_incident, offense_category_name, age_num, COUNT(*)
+        FROM victim_offender_rel_analysis
+        GROUP BY victim_activity_at_incident, offense_category_name, age_num
+    """,
+    "crime_daily_summary": f"""
+        INSERT INTO crime_daily_summary (d, primary_type, arrest, domestic, c)
+        SELECT DATE(date), primary_type, arrest, domestic, COUNT(*)
+        FROM chicago_crimes
+        WHERE {YEAR_RANGE}
+        GROUP BY DATE(date), primary_type, arrest, domestic
+    """,
+    "crime_location_summary": f"""
+        INSERT INTO crime_location_summary (year, primary_type, location_description, arrest, c)
+        SELECT YEAR(date), primary_type, location_description, arrest, COUNT(*)
+        FROM chicago_crimes
+        WHERE {YEAR_RANGE}
+        GROUP BY YEAR(date), primary_type, location_description, arrest
+    """,
+    "crime_area_summary": f"""
+        INSERT INTO crime_area_summary (year, community_area, primary_type, c)
+        SELECT YEAR(date), community_area, primary_type, COUNT(*)
+        FROM chicago_crimes
+        WHERE {YEAR_RANGE}
+        GROUP BY YEAR(date), community_area, primary_type
+    """,
+    "crime_missing_summary": missing_summary_sql(),
+    "agg_by_dow_hour": f"""
+        INSERT INTO agg_by_dow_hour (year, dow_hour, cnt)
+        SELECT YEAR(date), dow_hour, COUNT(*)
+        FROM chicago_crimes
+        WHERE {YEAR_RANGE}
+        GROUP BY YEAR(date), dow_hour
+    """,
+}
+
+# Chicago 数据写入后需要刷新的汇总表 (由 API-Chicago-request.py 在抓取结束时调用) -> 删除某一年旧数据的条件
+# 这些表按年份分批刷新，每年一个事务，避免整表 DELETE + INSERT 超出 TiDB 的单事务大小限制
+CHICAGO_YEAR_FILTERS = {
+    "crime_daily_summary": "d >= :start AND d < :end",
+    "crime_location_summary": "year = YEAR(:start)",
+    "crime_area_summary": "year = YEAR(:start)",
+    "crime_missing_summary": "year = YEAR(:start)",
+    "agg_by_dow_hour": "year = YEAR(:start)",
+}
+CHICAGO_TABLES = list(CHICAGO_YEAR_FILTERS)
+
+def chicago_years(engine):
+    """chicago_crimes 覆盖的年份 (idx_date 上取 MIN / MAX，不扫表)。"""
+    with engine.connect() as conn:
+        first, last = conn.execute(text("SELECT YEAR(MIN(date)), YEAR(MAX(date)) FROM chicago_crimes")).one()
+    return range(first, last + 1) if first is not None else range(0)
+
+def refresh_table(engine, table, insert_sql, years):
+    """
+    清理并重新写入一张汇总表，返回写入的行数。
+    Chicago 汇总表逐年重算，清理和重新写入同一年在一个事务里，看板不会读到某一年的半成品；
+    其余表整表在一个事务里重算。
+    """
+    year_filter = CHICAGO_YEAR_FILTERS.get(table)
+    if year_filter is None:
+        with engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {table}"))
+            return conn.execute(text(insert_sql)).rowcount
+
+    rows = 0
+    for year in years:
+        params = {"start": f"{year}-01-01", "end": f"{year + 1}-01-01"}
+        with engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {table} WHERE {year_filter}"), params)
+            rows += conn.execute(text(insert_sql), params).rowcount
+    return rows
+
+def refresh_all(engine, tables=None):
+    """逐张刷新汇总表 (默认全部)。"""
+    selected = [t for t in SUMMARY_TABLES if tables is None or t in tables]
+    years = chicago_years(engine) if any(t in CHICAGO_YEAR_FILTERS for t in selected) else range(0)
+    for table in selected:
+        start_time = time.time()
+        rows = refresh_table(engine, table, SUMMARY_TABLES[table], years)
+        print(f"✅ {table}: 写入 {rows} 行 ({time.time() - start_time:.2f}s)")
+
+if __name__ == "__main__":
+    refresh_all(engine_from_env())
@@ -1,32 +1,272 @@
+import calendar
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 import pydeck as pdk
 import os
 from dotenv import load_dotenv
+from sqlalchemy import create_engine
 
 
 # Import our analysis module
 import analysis
+import db
 import NIBRSAnalysis as nibrs
 # Load environment variables
 load_dotenv()
 
-# TiDB Connection Details
-TIDB_USER = st.secrets["TIDB_USER"]
-TIDB_PASSWORD = st.secrets["TIDB_PASSWORD"]
-TIDB_HOST = st.secrets["TIDB_HOST"]
-TIDB_PORT = st.secrets["TIDB_PORT"]
-TID_CA_PATH = st.secrets["TID_CA_PATH"]
-TIDB_DB_NAME = st.secrets["TIDB_DB_NAME"] or "Chicago_data"
+# Month number -> abbreviation ('' at index 0), indexed with the whole month column at once
+MONTH_ABBR = np.array(calendar.month_abbr)
+
+# Pie colours for the Key Statistics tab (notebook: Arrested -> #FF6B6B, Not Arrested -> #4ECDC4)
+COLORS_MAP = {'Arrested': '#FF6B6B', 'Not Arrested': '#4ECDC4', 
+              'True': '#FF6B6B', 'False': '#4ECDC4',
+              'Domestic': '#FF6B6B', 'Non-Domestic': '#4ECDC4'}
+WEEKEND = ('Sat', 'Sun')
 
 @st.cache_resource
-def get_db_connection():
-    url = f"mysql+pymysql://{TIDB_USER}:{TIDB_PASSWORD}@{TIDB_HOST}:{TIDB_PORT}/{TIDB_DB_NAME}?ssl_ca={TID_CA_PATH}&ssl_verify_cert=true&ssl_verify_identity=true"
-    engine = create_engine(url, pool_recycle=3600)
-    return engine
+def get_engine():
+    """
+    Process-wide pooled engine for the dashboard, shared by every session and rerun.
+    The pool covers the concurrent prefetch plus several sessions loading at once.
+    The compiled-statement cache is sized above the default 500 so the dashboard's
+    text() queries and their expanding IN variants are not recompiled after eviction.
+    """
+    url = db.tidb_url(st.secrets["TIDB_USER"], st.secrets["TIDB_PASSWORD"], st.secrets["TIDB_HOST"],
+                      st.secrets["TIDB_PORT"], st.secrets["TIDB_DB_NAME"], st.secrets["TID_CA_PATH"])
+    url += "&ssl_verify_cert=true&ssl_verify_identity=true"
+    return create_engine(url, pool_size=10, max_overflow=20, pool_pre_ping=True, pool_recycle=1800,
+                         query_cache_size=1200)
+
+def fetch(label, getter, *args, default=None, **kwargs):
+    """
+    Calls a cached getter and reports its error here, outside the cache, so a failed query
+    is shown once and retried on the next run instead of being cached as an empty result.
+    """
+    try:
+        return getter(*args, **kwargs)
+    except Exception as e:
+        st.error(f"Error fetching {label}: {e}")
+        return pd.DataFrame() if default is None else default
+
+# Figure builders are cached on their (small) input frames, so reruns reuse the built figure
+@st.cache_data
+def build_yearly_fig(yearly_df):
+    """Annual crime trend line."""
+    # Notebook: color='steelblue', marker='o'
+    fig_year = go.Figure(data=[go.Scatter(
+        x=yearly_df['year'].to_numpy(),
+        y=yearly_df['count'].to_numpy(),
+        mode='lines+markers',
+        line_color='steelblue',
+        marker=dict(size=8)
+    )])
+    fig_year.update_layout(title="Annual Number of Crime Cases",
+                           xaxis_title="Year",
+                           yaxis_title="Number of Cases")
+    return fig_year
+
+@st.cache_data
+def build_hour_day_heatmap_fig(heatmap_data):
+    """Hour vs Day of Week heatmap."""
+    return px.imshow(heatmap_data, 
+                     labels=dict(x="Hour of Day", y="Day of Week", color="Crime Count"),
+                     title="Crime Heatmap: Hour vs Day of Week",
+                     aspect="auto",
+                     color_continuous_scale='Viridis') # Notebook used Viridis
+
+def build_choropleth_fig(results, year, geojson):
+    """
+    Community-area choropleth for one year. Not cached: st.cache_data would pickle the
+    GeoJSON-laden figure on every rerun, and the GeoJSON is already a shared cached resource.
+    """
+    fig = px.choropleth_map(
+        data_frame=results,
+        geojson=geojson,
+        locations='community_area',      
+        featureidkey="properties.area_numbe", 
+        color='crime_count',             
+        color_continuous_scale="Reds",    
+        range_color=(0, results['crime_count'].max()),
+        map_style="carto-positron",
+        zoom=9,
+        center={"lat": 41.8781, "lon": -87.6298},
+        opacity=0.5,
+        labels={'crime_count': 'Count', 'community_name': 'Community', 'top_types': 'Top 5 Crimes'},
+        hover_data={'community_name': True, 'crime_count': True, 'top_types': True, 'community_area': False}
+    )
+    fig.update_layout(margin={"r":0,"t":30,"l":0,"b":0}, title=f"Crime Distribution in {year}")
+    return fig
+
+# Tabs with their own widgets run as fragments: changing a year or filter reruns only that tab,
+# not every query and chart on the page
+@st.fragment
+def geo_tab(engine):
+    """Geographical Distribution tab: binned heatmap and year-vs-year choropleths."""
+    st.header("Geographical Distribution")
+    st.markdown("**Crime Incident Locations**")
+    st.info("""
+    **Analyst Insight:**
+    *   **High Density Areas:** Concentrated crime activity is visible in specific urban centers and commercial districts.
+    *   **Sparse Areas:** Residential and suburban areas generally show lower incident rates.
+    *   **Hotspots:** Zooming in reveals specific blocks or intersections with recurring incidents.
+    """)
+    # 1. 让用户选择年份 (假设你的数据是 2015-2024)
+    available_years = analysis.ANALYSIS_YEARS
+    selected_year = st.selectbox("Please select a year to view the map:", available_years, index=len(available_years)-1)
+
+    with st.spinner("Fetching map data (this may take a moment)..."):
+        map_data = fetch("map data", analysis.get_map_data, engine, selected_year) # Binned on a ~100 m grid in the database
+        if not map_data.empty:
+            # st.map(map_data)
+            # Heatmap weighted by the number of crimes in each bin keeps the density of the raw points
+            layer = pdk.Layer(
+                "HeatmapLayer",
+                map_data,
+                get_position=["longitude", "latitude"],
+                get_weight="count",
+                radius_pixels=30,
+                opacity=0.8,
+            )
+            
+            view_state = pdk.ViewState(
+                latitude=41.8781, # Chicago Center
+                longitude=-87.6298,
+                zoom=10,
+                pitch=0,
+            )
+            
+            st.pydeck_chart(pdk.Deck(
+                layers=[layer],
+                initial_view_state=view_state,
+            ))
+        else:
+            st.warning("No location data available for map.")
+    
+    st.divider()
+    st.subheader("Comparative Crime Choropleth Maps by Community Area")
+    st.info("Compare crime distributions across different years.")
+
+    # Load GeoJSON once
+    geojson_data = analysis.get_geojson1()
+    
+    c1, c2 = st.columns(2)
+    
+    # --- Map 1 ---
+    with c1:
+        year_a = st.selectbox("Select Year (Left Map)", available_years, index=0, key="year_a_select")
+        results_a = fetch("choropleth data", analysis.draw_choropleth, engine, year_a)
+        
+        if not results_a.empty and geojson_data:
+            st.plotly_chart(build_choropleth_fig(results_a, year_a, geojson_data), use_container_width=True)
+        else:
+            st.warning(f"No data for {year_a}")
+
+    # --- Map 2 ---
+    with c2:
+        year_b = st.selectbox("Select Year (Right Map)", available_years, index=len(available_years)-1, key="year_b_select")
+        results_b = fetch("choropleth data", analysis.draw_choropleth, engine, year_b)
+        
+        if not results_b.empty and geojson_data:
+            st.plotly_chart(build_choropleth_fig(results_b, year_b, geojson_data), use_container_width=True)
+        else:
+            st.warning(f"No data for {year_b}")
+    
+    st.markdown("**Hardship index in Chicago (Layer:Community Area)**")
+    hardshipdf = pd.read_csv('Hardship Index of Chicago.csv')
+    st.dataframe(hardshipdf,width="stretch")
+
+@st.fragment
+def raw_data_tab(engine):
+    """Raw Data tab: the most recent records, in a user-chosen number of rows."""
+    st.header("Raw Data Sample (2015-2024)")
+    page_size = st.selectbox("Rows", analysis.RAW_PAGE_SIZES,
+                             index=analysis.RAW_PAGE_SIZES.index(analysis.RAW_DEFAULT_PAGE_SIZE))
+    st.write(f"Showing the most recent {page_size} records from the analysis period.")
+    
+    with st.spinner("Fetching data..."):
+        # DATE is a DATETIME column, so it already arrives as a timestamp
+        raw_df = fetch("recent data", analysis.get_recent_data, engine, limit=page_size)
+        # Fixed height: the grid renders only the visible rows
+        st.dataframe(raw_df, width="stretch", height=400)
+
+@st.fragment
+def victim_risk_tab(engine):
+    """Victim Risk Analysis tab (NIBRS), filtered by age range and offense category."""
+    st.header("Victim Risk Profiling Dashboard")
+    st.markdown("🕵️‍♂️ Victim Risk Profiling & Domestic Violence Analysis.")
+
+    # Victim Demographic    
+    # 1. Fetch Metadata first (Lightweight)
+    age_min, age_max, categories = fetch("filter options", nibrs.get_filter_metadata, engine, default=(0, 100, []))
+    
+    # Ensure age_min and age_max are valid integers
+    age_min = int(age_min) if age_min is not None else 0
+    age_max = int(age_max) if age_max is not None else 100
+    if age_max <= age_min: age_max = age_min + 1
+
+    selected_age = st.slider("Select Victim Age Range", age_min, age_max, (age_min, age_max))
+    selected_cat = st.multiselect("Select Offense Categories", categories, default=categories)
+
+    # 2. Fetch Aggregated Data (Optimized)
+    with st.spinner("Analyzing Victim Risk Data..."):
+         # KPI
+         total_victims, domestic_cases, avg_age = fetch("KPIs", nibrs.get_kpi_data, engine, selected_age, selected_cat,
+                                                           default=(0, 0, 0))
+         
+         col1, col2, col3 = st.columns(3)
+         with col1: st.metric("Total Victims", f"{total_victims:,}" if total_victims else "0")
+         with col2: st.metric("Domestic Cases", f"{domestic_cases:,}" if domestic_cases else "0")
+         with col3: st.metric("Avg Victim Age", round(avg_age, 1) if avg_age else 0)
+
+    st.divider()
+
+    # Demographics & Relationships
+    row1_col1, row1_col2 = st.columns(2)
+    
+    with row1_col1:
+        st.subheader("Victim Age & Gender Distribution")
+        with st.spinner("Loading demographics..."):
+            demo_df = fetch("demographics", nibrs.get_demographics_data, engine, selected_age, selected_cat)
+        if not demo_df.empty:
+            fig_age = px.histogram(demo_df, x="age_num", y="count", color="sex_code", 
+                                nbins=20, barmode="group", labels={'age_num': 'Age', 'sex_code': 'Gender'})
+            st.plotly_chart(fig_age, use_container_width=True)
+        else:
+            st.info("No demographic data available.")
+
+    with row1_col2:
+        st.subheader("Top 10 Victim-Offender Relationships")
+        with st.spinner("Loading relationships..."):
+            rel_df = fetch("relationships", nibrs.get_relationship_data, engine, selected_age, selected_cat)
+        if not rel_df.empty:
+            fig_rel = px.bar(rel_df, x='count', y='RELATIONSHIP_NAME', orientation='h', 
+                            color='count', title="Top Relationships")
+            # Rows arrive ordered by count DESC from SQL; reverse so the largest bar is on top
+            fig_rel.update_layout(yaxis={'categoryorder':'array', 'categoryarray': rel_df['RELATIONSHIP_NAME'].tolist()[::-1]})
+            st.plotly_chart(fig_rel, use_container_width=True)
+        else:
+            st.info("No relationship data available.")
+
+    # Heatmap
+    st.subheader("Victim Activity vs Offense Category")
+    with st.spinner("Generating heatmap..."):
+        heat_raw = fetch("heatmap data", nibrs.get_heatmap_data, engine, selected_age, selected_cat)
+    if not heat_raw.empty:
+        activity_heatmap = heat_raw.pivot(index='victim_activity_at_incident', columns='offense_category_name', values='count').fillna(0)
+        fig_heat = px.imshow(activity_heatmap, text_auto=True, aspect="auto", color_continuous_scale='Viridis')
+        st.plotly_chart(fig_heat, use_container_width=True)
+    else:
+        st.info("No activity data available.")
+
+    # Raw Data Sample
+    if st.checkbox("Show Raw Data Sample"):
+        with st.spinner("Fetching raw sample..."):
+            raw_df = fetch("raw sample", nibrs.get_raw_sample, engine, selected_age, selected_cat)
+        st.dataframe(raw_df, width="stretch")
+
 
 def main():
     st.set_page_config(page_title="Chicago Crime Analysis (2015-2024)", page_icon="📊", layout="wide")
@@ -38,11 +278,14 @@ def main():
     """)
 
     try:
-        engine = get_db_connection()
+        engine = get_engine()
     except Exception as e:
         st.error(f"Failed to connect to database: {e}")
         return
 
+    # Warm the query caches concurrently before the tabs read them one by one
+    analysis.prefetch_all(engine)
+
     # --- Tabs Layout ---
     tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
         "Overview", 
@@ -69,7 +312,7 @@ def main():
         col1, col2 = st.columns(2)
         with col1:
             with st.spinner("Fetching total record count..."):
-                total_records = analysis.get_total_records(engine)
+                total_records = fetch("total records", analysis.get_total_records, engine, default=0)
                 st.metric("Total Crime Records (2015-2024)", f"{total_records:,}")
         
         with col2:
@@ -77,7 +320,7 @@ def main():
 
         st.subheader("Missing Values Analysis")
         with st.spinner("Analyzing missing data..."):
-            missing_df = analysis.get_missing_values_summary(engine)
+            missing_df = fetch("missing values", analysis.get_missing_values_summary, engine)
             if not missing_df.empty:
                 st.dataframe(missing_df, width="stretch")
                 
@@ -91,131 +334,19 @@ def main():
 
     # --- TAB 2: GEOGRAPHICAL DISTRIBUTION ---
     with tab2:
-        st.header("Geographical Distribution")
-        st.markdown("**Crime Incident Locations**")
-        st.info("""
-        **Analyst Insight:**
-        *   **High Density Areas:** Concentrated crime activity is visible in specific urban centers and commercial districts.
-        *   **Sparse Areas:** Residential and suburban areas generally show lower incident rates.
-        *   **Hotspots:** Zooming in reveals specific blocks or intersections with recurring incidents.
-        """)
-                # 1. 让用户选择年份 (假设你的数据是 2015-2024)
-        available_years = list(range(2015, 2025))
-        selected_year = st.selectbox("Please select a year to view the map:", available_years, index=len(available_years)-1)
-
-        with st.spinner("Fetching map data (this may take a moment)..."):
-            map_data = analysis.get_map_data(engine, selected_year, limit=200000) # Limit points for performance
-            if not map_data.empty:
-                # st.map(map_data)
-                # Use PyDeck for more control over point size (radius) and color
-                layer = pdk.Layer(
-                    "ScatterplotLayer",
-                    map_data,
-                    get_position=["longitude", "latitude"],
-                    get_color=[200, 30, 0, 160], # Red with transparency
-                    get_radius=20,  # Radius in meters. Adjust to make smaller/larger.
-                    pickable=True,
-                    opacity=0.8,
-                    filled=True,
-                )
-                
-                view_state = pdk.ViewState(
-                    latitude=41.8781, # Chicago Center
-                    longitude=-87.6298,
-                    zoom=10,
-                    pitch=0,
-                )
-                
-                st.pydeck_chart(pdk.Deck(
-                    layers=[layer],
-                    initial_view_state=view_state,
-                    tooltip={"text": "Crime Location"}
-                ))
-            else:
-                st.warning("No location data available for map.")
-        
-        st.divider()
-        st.subheader("Comparative Crime Choropleth Maps by Community Area")
-        st.info("Compare crime distributions across different years.")
+        geo_tab(engine)
 
-        # Load GeoJSON once
-        geojson_data = analysis.get_geojson1()
-        
-        c1, c2 = st.columns(2)
-        
-        # --- Map 1 ---
-        with c1:
-            year_a = st.selectbox("Select Year (Left Map)", available_years, index=0, key="year_a_select")
-            results_a = analysis.draw_choropleth(engine, year_a)
-            
-            if not results_a.empty and geojson_data:
-                fig_a = px.choropleth_map(
-                    data_frame=results_a,
-                    geojson=geojson_data,
-                    locations='community_area',      
-                    featureidkey="properties.area_numbe", 
-                    color='crime_count',             
-                    color_continuous_scale="Reds",    
-                    range_color=(0, results_a['crime_count'].max()),
-                    map_style="carto-positron",
-                    zoom=9,
-                    center={"lat": 41.8781, "lon": -87.6298},
-                    opacity=0.5,
-                    labels={'crime_count': 'Count', 'community_name': 'Community', 'top_types': 'Top 5 Crimes'},
-                    hover_data={'community_name': True, 'crime_count': True, 'top_types': True, 'community_area': False}
-                )
-                fig_a.update_layout(margin={"r":0,"t":30,"l":0,"b":0}, title=f"Crime Distribution in {year_a}")
-                st.plotly_chart(fig_a, use_container_width=True)
-            else:
-                st.warning(f"No data for {year_a}")
-
-        # --- Map 2 ---
-        with c2:
-            year_b = st.selectbox("Select Year (Right Map)", available_years, index=len(available_years)-1, key="year_b_select")
-            results_b = analysis.draw_choropleth(engine, year_b)
-            
-            if not results_b.empty and geojson_data:
-                fig_b = px.choropleth_map(
-                    data_frame=results_b,
-                    geojson=geojson_data,
-                    locations='community_area',      
-                    featureidkey="properties.area_numbe", 
-                    color='crime_count',             
-                    color_continuous_scale="Reds",    
-                    range_color=(0, results_b['crime_count'].max()),
-                    map_style="carto-positron",
-                    zoom=9,
-                    center={"lat": 41.8781, "lon": -87.6298},
-                    opacity=0.5,
-                    labels={'crime_count': 'Count', 'community_name': 'Community', 'top_types': 'Top 5 Crimes'},
-                    hover_data={'community_name': True, 'crime_count': True, 'top_types': True, 'community_area': False}
-                )
-                fig_b.update_layout(margin={"r":0,"t":30,"l":0,"b":0}, title=f"Crime Distribution in {year_b}")
-                st.plotly_chart(fig_b, use_container_width=True)
-            else:
-                st.warning(f"No data for {year_b}")
-        
-        st.markdown("**Hardship index in Chicago (Layer:Community Area)**")
-        hardshipdf = pd.read_csv('Hardship Index of Chicago.csv')
-        st.dataframe(hardshipdf,width="stretch")
-    
     # --- TAB 3: RAW DATA ---
     with tab3:
-        st.header("Raw Data Sample (2015-2024)")
-        st.write("Showing the most recent 1000 records from the analysis period.")
-        
-        with st.spinner("Fetching data..."):
-            raw_df = analysis.get_recent_data(engine, limit=1000)
-            if 'DATE' in raw_df.columns:
-                 raw_df['DATE'] = pd.to_datetime(raw_df['DATE'])
-            st.dataframe(raw_df, width="stretch")
+        raw_data_tab(engine)
 
     # --- TAB 4: KEY STATISTICS ---
     with tab4:
         st.header("Key Statistics")
         
         with st.spinner("Fetching breakdown..."):
-            stats = analysis.get_arrest_domestic_stats(engine)
+            stats = fetch("arrest/domestic stats", analysis.get_arrest_domestic_stats, engine,
+                          default={'arrest': pd.DataFrame(), 'domestic': pd.DataFrame()})
             arrest_counts = stats['arrest']
             domestic_counts = stats['domestic']
 
@@ -233,10 +364,6 @@ def main():
         # labels=[Arrested, Not Arrested]
         # So Arrested -> #FF6B6B, Not Arrested -> #4ECDC4 
         
-        colors_map = {'Arrested': '#FF6B6B', 'Not Arrested': '#4ECDC4', 
-                      'True': '#FF6B6B', 'False': '#4ECDC4',
-                      'Domestic': '#FF6B6B', 'Non-Domestic': '#4ECDC4'}
-
         with col1:
             st.subheader("Arrest Distribution")
             st.info("""
@@ -246,12 +373,15 @@ def main():
             *   **Seasonal Trend:** Arrest efficiency is slightly higher in winter months (Jan/Feb ~20%) compared to summer (~16%).
             """)
             if not arrest_counts.empty:
-                 arrest_counts['Status'] = arrest_counts['Arrest'].apply(lambda x: 'Arrested' if x=='True' else 'Not Arrested')
+                 arrest_counts['Status'] = arrest_counts['Arrest'].map({'True': 'Arrested', 'False': 'Not Arrested'})
                  # Enforce specific color mapping based on Status value
-                 fig_arrest = px.pie(arrest_counts, values='Count', names='Status', 
-                                     title="Distribution of Arrest Status",
-                                     color='Status',
-                                     color_discrete_map=colors_map)
+                 fig_arrest = go.Figure(data=[go.Pie(
+                     labels=arrest_counts['Status'].to_numpy(),
+                     values=arrest_counts['Count'].to_numpy(),
+                     marker=dict(colors=arrest_counts['Status'].map(COLORS_MAP).to_numpy()),
+                     sort=False
+                 )])
+                 fig_arrest.update_layout(title="Distribution of Arrest Status")
                  st.plotly_chart(fig_arrest, width="stretch")
         
         with col2:
@@ -261,12 +391,15 @@ def main():
             *   **Key Offenses:** Battery, Other Offense, and Assault are the primary contributors to domestic violence incidents.
             """)
             if not domestic_counts.empty:
-                 domestic_counts['Type'] = domestic_counts['Domestic'].apply(lambda x: 'Domestic' if x=='True' else 'Non-Domestic')
+                 domestic_counts['Type'] = domestic_counts['Domestic'].map({'True': 'Domestic', 'False': 'Non-Domestic'})
                  # Notebook used same colors for Domestic vs No Domestic
-                 fig_domestic = px.pie(domestic_counts, values='Count', names='Type', 
-                                       title="Domestic Violence Incidents",
-                                       color='Type',
-                                       color_discrete_map=colors_map)
+                 fig_domestic = go.Figure(data=[go.Pie(
+                     labels=domestic_counts['Type'].to_numpy(),
+                     values=domestic_counts['Count'].to_numpy(),
+                     marker=dict(colors=domestic_counts['Type'].map(COLORS_MAP).to_numpy()),
+                     sort=False
+                 )])
+                 fig_domestic.update_layout(title="Domestic Violence Incidents")
                  st.plotly_chart(fig_domestic, width="stretch")
 
     # --- TAB 5: TEMPORAL TRENDS ---
@@ -281,14 +414,9 @@ def main():
         *   **Post-2020:** A gradual recovery trend is observed in subsequent years, though patterns have shifted.
         """)
         with st.spinner("Loading yearly data..."):
-            yearly_df = analysis.get_yearly_trends(engine)
+            yearly_df = fetch("yearly trends", analysis.get_yearly_trends, engine)
             if not yearly_df.empty:
-                 # Notebook: color='steelblue', marker='o'
-                 fig_year = px.line(yearly_df, x='year', y='count', markers=True,
-                                    title="Annual Number of Crime Cases",
-                                    labels={'count': 'Number of Cases', 'year': 'Year'})
-                 fig_year.update_traces(line_color='steelblue', marker=dict(size=8))
-                 st.plotly_chart(fig_year, width="stretch")
+                 st.plotly_chart(build_yearly_fig(yearly_df), width="stretch")
 
         # Monthly Seasonality
         st.subheader("Monthly Distribution")
@@ -298,17 +426,20 @@ def main():
         *   **Winter Low:** Significant drop in incidents during colder months (January-February).
         """)
         with st.spinner("Loading monthly data..."):
-            monthly_df = analysis.get_monthly_trends(engine)
+            monthly_df = fetch("monthly trends", analysis.get_monthly_trends, engine)
             if not monthly_df.empty:
                  # Map month number to Name
-                 import calendar
-                 monthly_df['Month Name'] = monthly_df['month'].apply(lambda x: calendar.month_abbr[int(x)])
+                 monthly_df['Month Name'] = MONTH_ABBR[monthly_df['month'].to_numpy()]
                  
                  # Notebook: color='coral'
-                 fig_month = px.bar(monthly_df, x='Month Name', y='count',
-                                    title="Monthly Distribution of Crime Cases",
-                                    labels={'count': 'Number of Cases', 'Month Name': 'Month'})
-                 fig_month.update_traces(marker_color='coral')
+                 fig_month = go.Figure(data=[go.Bar(
+                     x=monthly_df['Month Name'].to_numpy(),
+                     y=monthly_df['count'].to_numpy(),
+                     marker_color='coral'
+                 )])
+                 fig_month.update_layout(title="Monthly Distribution of Crime Cases",
+                                         xaxis_title="Month",
+                                         yaxis_title="Number of Cases")
                  st.plotly_chart(fig_month, width="stretch")
 
         # Day of Week Distribution
@@ -319,14 +450,14 @@ def main():
         *   **Weekday Lull:** Mid-week days (Tuesday/Wednesday) generally show slightly lower incident counts.
         """)
         with st.spinner("Loading weekly data..."):
-            dow_df = analysis.get_day_of_week_counts(engine)
+            dow_df = fetch("day of week trends", analysis.get_day_of_week_counts, engine)
             if not dow_df.empty:
                 # Notebook colors: Weekdays (Mon-Fri) #FF6B6B (Red), Weekend (Sat-Sun) #4ECDC4 (Green)
                 # Note: list order in notebook was Mon, Tue, Wed, Thu, Fri, Sat, Sun
                 # colors = ['#FF6B6B']*5 + ['#4ECDC4']*2
                 
                 # We can create a color column
-                dow_df['Color'] = dow_df['Day'].apply(lambda x: '#4ECDC4' if x in ['Sat', 'Sun'] else '#FF6B6B')
+                dow_df['Color'] = np.where(dow_df['Day'].isin(WEEKEND), '#4ECDC4', '#FF6B6B')
                 
                 fig_dow = go.Figure(data=[go.Bar(
                     x=dow_df['Day'],
@@ -346,20 +477,15 @@ def main():
         *   **Quiet Hours:** Early mornings (3 AM - 6 AM) show the lowest activity.
         """)
         with st.spinner("Generating heatmap..."):
-            heatmap_data = analysis.get_heatmap_data(engine)
+            heatmap_data = fetch("heatmap data", analysis.get_heatmap_data, engine)
             if not heatmap_data.empty:
-                 fig_heat = px.imshow(heatmap_data, 
-                                      labels=dict(x="Hour of Day", y="Day of Week", color="Crime Count"),
-                                      title="Crime Heatmap: Hour vs Day of Week",
-                                      aspect="auto",
-                                      color_continuous_scale='Viridis') # Notebook used Viridis
-                 st.plotly_chart(fig_heat, width="stretch")
+                 st.plotly_chart(build_hour_day_heatmap_fig(heatmap_data), width="stretch")
 
         st.subheader("All Crime Types Temporal Trends")
         st.info("Percentage distribution of all crime types over the last 10 years. Each crime type's yearly bars sum to 100%.")
         with st.spinner("Loading all types yearly trend..."):
              # Fetch ALL crime types by setting limit=None
-             all_types_yearly_df = analysis.get_top_crime_types_yearly(engine, limit=None)
+             all_types_yearly_df = fetch("crime types yearly trends", analysis.get_top_crime_types_yearly, engine, limit=None)
              
              if not all_types_yearly_df.empty:
                  # Calculate percentage per crime type
@@ -378,11 +504,8 @@ def main():
                  
                  # Define transform function: Map 0-30 linear, 30-100 compressed to 30-40 visual space
                  # Factor: 10 units of visual space for 70 units of actual space (30->100)
-                 def scale_y(val):
-                     if val <= 30: return val
-                     return 30 + (val - 30) * (10/70)
-
-                 all_types_yearly_df['y_visual'] = all_types_yearly_df['percentage'].apply(scale_y)
+                 pct = all_types_yearly_df['percentage']
+                 all_types_yearly_df['y_visual'] = np.where(pct <= 30, pct, 30 + (pct - 30) * (10/70))
                  
                  fig_all_trend = px.bar(
                      all_types_yearly_df,
@@ -437,7 +560,7 @@ def main():
         with col1:
              st.subheader("Top 10 Crime Types (Arrest Breakdown)")
              with st.spinner("Fetching crime types..."):
-                 top_crimes = analysis.get_top_crime_types_stacked(engine, limit=10)
+                 top_crimes = fetch("top crime types", analysis.get_top_crime_types_stacked, engine, limit=10)
                  if not top_crimes.empty:
                      # Identify top types for heatmap later
                      top_type_names = top_crimes.groupby('primary_type')['count'].sum().sort_values(ascending=False).index.tolist()
@@ -459,7 +582,7 @@ def main():
         with col2:
              st.subheader("Top 10 Locations (Arrest Breakdown)")
              with st.spinner("Fetching locations..."):
-                 top_locs = analysis.get_top_locations_stacked(engine, limit=10)
+                 top_locs = fetch("top locations", analysis.get_top_locations_stacked, engine, limit=10)
                  if not top_locs.empty:
                      # Identify top locations for heatmap later
                      top_loc_names = top_locs.groupby('location_description')['count'].sum().sort_values(ascending=False).index.tolist()
@@ -484,7 +607,8 @@ def main():
         
         with st.spinner("Generating crime-location heatmap..."):
             if top_type_names and top_loc_names:
-                heatmap_data = analysis.get_crime_location_heatmap(engine, top_type_names, top_loc_names)
+                heatmap_data = fetch("crime-location heatmap", analysis.get_crime_location_heatmap,
+                                     engine, top_type_names, top_loc_names)
                 if not heatmap_data.empty:
                     fig_heat = px.imshow(
                         heatmap_data, 
@@ -510,75 +634,8 @@ def main():
 
     # Tab 7 Victim Demographic
     with tab7:
-        st.header("Victim Risk Profiling Dashboard")
-        st.markdown("🕵️‍♂️ Victim Risk Profiling & Domestic Violence Analysis.")
-
-        # Victim Demographic    
-        # 1. Fetch Metadata first (Lightweight)
-        age_min, age_max, categories = nibrs.get_filter_metadata(engine)
-        
-        # Ensure age_min and age_max are valid integers
-        age_min = int(age_min) if age_min is not None else 0
-        age_max = int(age_max) if age_max is not None else 100
-        if age_max <= age_min: age_max = age_min + 1
-
-        selected_age = st.slider("Select Victim Age Range", age_min, age_max, (age_min, age_max))
-        selected_cat = st.multiselect("Select Offense Categories", categories, default=categories)
-
-        # 2. Fetch Aggregated Data (Optimized)
-        with st.spinner("Analyzing Victim Risk Data..."):
-             # KPI
-             total_victims, domestic_cases, avg_age = nibrs.get_kpi_data(engine, selected_age, selected_cat)
-             
-             col1, col2, col3 = st.columns(3)
-             with col1: st.metric("Total Victims", f"{total_victims:,}" if total_victims else "0")
-             with col2: st.metric("Domestic Cases", f"{domestic_cases:,}" if domestic_cases else "0")
-             with col3: st.metric("Avg Victim Age", round(avg_age, 1) if avg_age else 0)
-
-        st.divider()
-
-        # Demographics & Relationships
-        row1_col1, row1_col2 = st.columns(2)
-        
-        with row1_col1:
-            st.subheader("Victim Age & Gender Distribution")
-            with st.spinner("Loading demographics..."):
-                demo_df = nibrs.get_demographics_data(engine, selected_age, selected_cat)
-            if not demo_df.empty:
-                fig_age = px.histogram(demo_df, x="age_num", y="count", color="sex_code", 
-                                    nbins=20, barmode="group", labels={'age_num': 'Age', 'sex_code': 'Gender'})
-                st.plotly_chart(fig_age, use_container_width=True)
-            else:
-                st.info("No demographic data available.")
-
-        with row1_col2:
-            st.subheader("Top 10 Victim-Offender Relationships")
-            with st.spinner("Loading relationships..."):
-                rel_df = nibrs.get_relationship_data(engine, selected_age, selected_cat)
-            if not rel_df.empty:
-                fig_rel = px.bar(rel_df, x='count', y='RELATIONSHIP_NAME', orientation='h', 
-                                color='count', title="Top Relationships")
-                fig_rel.update_layout(yaxis={'categoryorder':'total ascending'})
-                st.plotly_chart(fig_rel, use_container_width=True)
-            else:
-                st.info("No relationship data available.")
-
-        # Heatmap
-        st.subheader("Victim Activity vs Offense Category")
-        with st.spinner("Generating heatmap..."):
-            heat_raw = nibrs.get_heatmap_data(engine, selected_age, selected_cat)
-        if not heat_raw.empty:
-            activity_heatmap = heat_raw.pivot(index='victim_activity_at_incident', columns='offense_category_name', values='count').fillna(0)
-            fig_heat = px.imshow(activity_heatmap, text_auto=True, aspect="auto", color_continuous_scale='Viridis')
-            st.plotly_chart(fig_heat, use_container_width=True)
-        else:
-            st.info("No activity data available.")
+        victim_risk_tab(engine)
 
-        # Raw Data Sample
-        if st.checkbox("Show Raw Data Sample"):
-            with st.spinner("Fetching raw sample..."):
-                raw_df = nibrs.get_raw_sample(engine, selected_age, selected_cat)
-            st.dataframe(raw_df, width="stretch")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file